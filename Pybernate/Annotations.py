@@ -1,49 +1,59 @@
-import functools
-
 def lazy(func):
-    def func_wrapper(*args, **kwargs):
-        args[0].add_lazy(func.__name__)
-        return func(*args, **kwargs)
-
-    return func_wrapper
+    func._pybernate_lazy = True
+    return func
 
 
 def transient(func):
-    def func_wrapper(*args, **kwargs):
-        args[0].add_transient(func.__name__)
-        return func(*args, **kwargs)
+    func._pybernate_transient = True
+    return func
 
-    return func_wrapper
 
 def id(func):
-    def func_wrapper(*args, **kwargs):
-        args[0].set_id_column(func.__name__[4:])
-        return func(*args, **kwargs)
+    func._pybernate_id = True
+    return func
 
-    return func_wrapper
 
+def version(func):
+    func._pybernate_version = True
+    return func
+
+
+FETCH_STRATEGIES = ("select", "batch", "join")
+COLLECTION_FETCH_STRATEGIES = FETCH_STRATEGIES + ("lazy",)
+
+
+def _fetch_strategy(kwargs, strategies=FETCH_STRATEGIES):
+    fetch = kwargs["fetch"] if "fetch" in kwargs else "select"
+    if fetch not in strategies:
+        raise ValueError("fetch must be one of {}".format(", ".join(strategies)))
+    return fetch
 
-# class table:
-#     def __init__(self, **kwargs):
-#         self.table = kwargs["name"]
-#
-#     def __call__(self, fn):
-#         @functools.wraps(fn)
-#         def decorated(*args, **kwargs):
-#             fn.set_table(fn.__name__, self.table)
-#             fn(*args, **kwargs)
-#         return decorated
 
 class table:
     def __init__(self, **kwargs):
         self.table = kwargs["name"]
 
     def __call__(self, fn):
-        @functools.wraps(fn)
-        def decorated(*args, **kwargs):
-            args[0].set_table(fn.__name__, self.table)
-            fn(*args, **kwargs)
-        return decorated
+        fn._pybernate_table = self.table
+        return fn
+
+class convert:
+    def __init__(self, **kwargs):
+        self.load = kwargs["load"]
+        self.dump = kwargs["dump"] if "dump" in kwargs else None
+
+    def __call__(self, fn):
+        fn._pybernate_convert = (self.load, self.dump)
+        return fn
+
+class cacheable:
+    def __init__(self, **kwargs):
+        self.maxsize = kwargs["maxsize"] if "maxsize" in kwargs else 1000
+        self.ttl = kwargs["ttl"] if "ttl" in kwargs else 300
+
+    def __call__(self, clazz):
+        clazz._pybernate_cacheable = (self.maxsize, self.ttl)
+        return clazz
 
 # class column:
 #     def __init__(self, **kwargs):
@@ -62,13 +72,11 @@ class oneToMany:
         self.join_column = kwargs["join_column"]
         self.foreign_key = kwargs["foreign_key"]
         self.mapped_by = kwargs["mapped_by"] if "mapped_by" in kwargs else None
+        self.fetch = _fetch_strategy(kwargs, COLLECTION_FETCH_STRATEGIES)
 
     def __call__(self, fn):
-        @functools.wraps(fn)
-        def decorated(*args, **kwargs):
-            args[0].addOneToMany(fn.__name__, (self.join_table, self.join_column, self.foreign_key, self.mapped_by))
-            fn(*args, **kwargs)
-        return decorated
+        fn._pybernate_one_to_many = (self.join_table, self.join_column, self.foreign_key, self.mapped_by, self.fetch)
+        return fn
 
 
 class manyToOne:
@@ -76,10 +84,8 @@ class manyToOne:
         self.join_table = kwargs["join_table"]
         self.join_column = kwargs["join_column"]
         self.foreign_key = kwargs["foreign_key"]
+        self.fetch = _fetch_strategy(kwargs)
 
     def __call__(self, fn):
-        @functools.wraps(fn)
-        def decorated(*args, **kwargs):
-            args[0].addManyToOne(fn.__name__, (self.join_table, self.join_column, self.foreign_key))
-            fn(*args, **kwargs)
-        return decorated
\ No newline at end of file
+        fn._pybernate_many_to_one = (self.join_table, self.join_column, self.foreign_key, self.fetch)
+        return fn
@@ -0,0 +1,271 @@
+import asyncio
+import time
+from collections.abc import Iterable
+from Pybernate.EntityService import LFUEntityCache, LoadContext, get_fetch_plan, get_key, set_one_to_many
+from Pybernate.Exceptions import NoMatchingSchemaException, NoSuchEntityException, InvalidEntityServiceException
+from Pybernate.Dialect import MySQLDialect
+from Pybernate.Mapper import get_row_keys
+from Pybernate.Statements import pad_values
+from Pybernate.Statistics import Statistics
+
+
+class AsyncSafeExecutor:
+    def __init__(self, name, statistics=None, dialect=None):
+        self.name = name
+        self.statistics = statistics or Statistics(name)
+        self.dialect = dialect or MySQLDialect()
+
+    async def execute(self, cursor, query, values):
+        start = time.perf_counter()
+        try:
+            await cursor.execute(query, values)
+        except Exception:
+            raise NoMatchingSchemaException(self.name)
+        self.statistics.record_statement(self.name, query, values, time.perf_counter() - start, cursor.rowcount)
+        return cursor
+
+    async def executemany(self, cursor, query, values):
+        start = time.perf_counter()
+        try:
+            await cursor.executemany(query, values)
+        except Exception:
+            raise NoMatchingSchemaException(self.name)
+        self.statistics.record_statement(self.name, query, values, time.perf_counter() - start, cursor.rowcount)
+        return cursor
+
+
+class AsyncEntityCache(LFUEntityCache):
+    def __init__(self, maxsize, clazz, safe_executor, chunk_size=500):
+        super().__init__(maxsize, None, clazz, safe_executor, chunk_size=chunk_size)
+
+    async def write_pending(self, cursor):
+        for method, query, values, ids in self.get_pending_writes(self.get_flush_entities()):
+            self.check_rowcount(await getattr(self.safe_executor, method)(cursor, query, values), ids)
+
+
+class AsyncEntityService:
+    def __init__(self, clazz, session, maxsize, chunk_size=500, max_depth=None):
+        self.clazz = clazz
+        self.session = session
+        self.chunk_size = chunk_size
+        self.max_depth = max_depth
+        self.statistics = Statistics(self.get_name(), session.statistics)
+        self.safe_executor = AsyncSafeExecutor(self.get_name(), self.statistics)
+        self.cache = AsyncEntityCache(maxsize, self.clazz, self.safe_executor, chunk_size)
+        self.statements = clazz.get_mapper().statements
+
+    def get_name(self):
+        return self.clazz.__name__
+
+    async def fetchall(self, query, values):
+        async with self.session.read_connection() as conn:
+            async with conn.cursor() as cursor:
+                await self.safe_executor.execute(cursor, query, values)
+                return await cursor.fetchall()
+
+    async def flush_cache(self):
+        await self.session.flush_caches([self.cache])
+        self.cache.discard()
+
+    def _to_list(self, entities):
+        if isinstance(entities, self.clazz):
+            return [entities]
+        if isinstance(entities, Iterable):
+            return list(entities)
+        raise InvalidEntityServiceException(entities.__class__.__name__, self.get_name())
+
+    async def save(self, to_save):
+        entities = self._to_list(to_save)
+        for entity in entities:
+            if not isinstance(entity, self.clazz):
+                raise InvalidEntityServiceException(entity.__class__.__name__, self.get_name())
+        conn = await self.session.get_write_connection()
+        async with self.session.lock, conn.cursor() as cursor:
+            for entity in entities:
+                if entity._is_new():
+                    entity._init_version()
+                    fields = entity.get_insert_fields()
+                    values = entity.get_raw_elements()
+                    if entity.id is not None:
+                        fields = [entity.id_column] + fields
+                        values = [entity.id] + values
+                    await self.safe_executor.execute(cursor, self.statements.insert(fields), values)
+                    if entity.id is None:
+                        entity.id = cursor.lastrowid
+                    entity._set_new(False)
+                    entity.set_dirty(False)
+                elif self.cache.get_cached(entity.id) is not entity:
+                    entity.set_dirty(True)
+                self.cache.cache(entity.id, entity)
+
+    async def delete(self, to_delete):
+        for entity in self._to_list(to_delete):
+            if not isinstance(entity, self.clazz):
+                raise InvalidEntityServiceException(entity.__class__.__name__, self.get_name())
+            entity.set_deleted(True)
+            self.cache.cache(entity.get_id(), entity)
+
+
+class AsyncIdEntityService(AsyncEntityService):
+    async def by_id(self, entity_id, max_depth=None, fetch=None):
+        return (await self.by_ids([entity_id], max_depth, fetch))[0]
+
+    async def by_ids(self, entity_ids, max_depth=None, fetch=None):
+        context = LoadContext(self.max_depth if max_depth is None else max_depth)
+        return await self._load_ids(entity_ids, context, 0, get_fetch_plan(fetch))
+
+    async def _load_ids(self, entity_ids, context, depth, plan):
+        entities = await self._get_by_ids(entity_ids)
+        pending = {entity.get_id(): entity for entity in entities if not entity.get_initialized()}
+        await self._init_relationships(list(pending.values()), context, depth, plan)
+        return entities
+
+    async def load_relationship(self, entities, name, max_depth=None):
+        context = LoadContext(max_depth)
+        await self._init_relationship(context.visit(entities), name, context, 0, None)
+
+    async def _get_by_ids(self, ids):
+        loaded = {}
+        missing = []
+        for id in ids:
+            if id in loaded:
+                continue
+            entity = self.cache.get_cached(id)
+            if entity is None:
+                if id not in missing:
+                    missing.append(id)
+                continue
+            if entity.get_deleted():
+                raise NoSuchEntityException(self.get_name(), id)
+            loaded[id] = entity
+        chunks = [pad_values(missing[start:start + self.chunk_size]) for start in range(0, len(missing), self.chunk_size)]
+        results = await asyncio.gather(*[self.fetchall(self.statements.select_lazy(len(chunk)), chunk)
+                                         for chunk in chunks])
+        for rows in results:
+            if not rows:
+                continue
+            hydrate = self.cache.get_hydrator(self.statements.lazy_fields, rows[0])
+            for row in rows:
+                entity = self.cache.load(row, hydrate)
+                loaded[entity.get_id()] = entity
+        for id in missing:
+            if id not in loaded:
+                raise NoSuchEntityException(self.get_name(), id)
+        return [loaded[id] for id in ids]
+
+    async def get_by_column(self, column, keys):
+        if column == self.statements.mapper.id_column:
+            entities = await self._get_by_ids(keys)
+            return list(zip(keys, entities))
+        related = []
+        chunks = [pad_values(keys[start:start + self.chunk_size]) for start in range(0, len(keys), self.chunk_size)]
+        results = await asyncio.gather(*[self.fetchall(self.statements.select_by(column, len(chunk)), chunk)
+                                         for chunk in chunks])
+        fields = self.statements.get_select_by_fields(column)
+        for rows in results:
+            if not rows:
+                continue
+            hydrate = self.cache.get_hydrator(fields, rows[0])
+            column_key = hydrate.keys[fields.index(column)]
+            for row in rows:
+                entity = self.cache.load(row, hydrate)
+                if not entity.get_deleted():
+                    related.append((row[column_key], entity))
+        return related
+
+    async def _get_related(self, entities, other_service, join_column, foreign_key, context, depth, plan):
+        keys = []
+        for entity in entities:
+            key = get_key(entity, join_column)
+            if key is not None and key not in keys:
+                keys.append(key)
+        related = {}
+        for key, other in await other_service.get_by_column(foreign_key, keys):
+            related.setdefault(key, []).append(other)
+        pending = {}
+        for others in related.values():
+            for other in others:
+                if not other.get_initialized():
+                    pending[other.get_id()] = other
+        await other_service._init_relationships(list(pending.values()), context, depth, plan)
+        return related
+
+    async def _init_relationships(self, entities, context, depth, plan):
+        entities = context.visit(entities)
+        if not entities:
+            return
+        mapper = self.clazz.get_mapper()
+        loads = []
+        for name in list(mapper.one_to_many) + list(mapper.many_to_one):
+            if context.follows(depth, plan, name):
+                loads.append(self._init_relationship(entities, name, context, depth, plan))
+                continue
+            for entity in entities:
+                entity.set_lazy_relationship(name, None)
+        await asyncio.gather(*loads)
+        for entity in entities:
+            entity.set_initialized(True)
+            self.cache.cache(entity.get_id(), entity)
+
+    async def _init_relationship(self, entities, name, context, depth, plan):
+        mapper = self.clazz.get_mapper()
+        plan = plan[name] if plan is not None else None
+        if name in mapper.one_to_many:
+            other_class, join_column, foreign_key, mapped_by, fetch = mapper.one_to_many[name]
+            other_service = self.session.services[other_class]
+            if fetch == "select":
+                await asyncio.gather(*[self._init_one_to_many(entity, name, other_service, join_column, foreign_key,
+                                                              mapped_by, context, depth + 1, plan)
+                                       for entity in entities])
+                return
+            related = await self._get_related(entities, other_service, join_column, foreign_key, context, depth + 1,
+                                              plan)
+            for entity in entities:
+                set_one_to_many(entity, name, related.get(get_key(entity, join_column), []), mapped_by)
+            return
+        other_class, join_column, foreign_key, fetch = mapper.many_to_one[name]
+        other_service = self.session.services[other_class]
+        if fetch == "select":
+            await asyncio.gather(*[self._init_many_to_one(entity, name, other_service, join_column, context,
+                                                          depth + 1, plan)
+                                   for entity in entities])
+            return
+        related = await self._get_related(entities, other_service, join_column, foreign_key, context, depth + 1, plan)
+        for entity in entities:
+            key = get_key(entity, join_column)
+            if key is not None and not related.get(key):
+                raise NoSuchEntityException(other_service.get_name(), key)
+            entity.set_relationship(name, related[key][0] if key is not None else None)
+
+    async def _init_many_to_one(self, entity, name, other_service, join_column, context, depth, plan):
+        key = get_key(entity, join_column)
+        loaded_entity = (await other_service._load_ids([key], context, depth, plan))[0] if key is not None else None
+        entity.set_relationship(name, loaded_entity)
+
+    async def _init_one_to_many(self, entity, name, other_service, join_column, foreign_key, mapped_by, context,
+                                depth, plan):
+        other_mapper = other_service.clazz.get_mapper()
+        rows = await self.fetchall(other_mapper.statements.select_ids_by(foreign_key), [get_key(entity, join_column)])
+        ids = []
+        if rows:
+            id_key, = get_row_keys((other_mapper.id_column,), rows[0])
+            ids = [row[id_key] for row in rows]
+        loaded_entities = await other_service._load_ids(ids, context, depth, plan)
+        set_one_to_many(entity, name, loaded_entities, mapped_by)
+
+    async def initialize(self, entities, *attributes):
+        if isinstance(entities, self.clazz):
+            entities = [entities]
+        mapper = self.clazz.get_mapper()
+        fields = (attributes or tuple(sorted(mapper.lazies))) + (mapper.id_column,)
+        by_id = {entity.get_id(): entity for entity in entities}
+        ids = list(by_id)
+        chunks = [pad_values(ids[start:start + self.chunk_size]) for start in range(0, len(ids), self.chunk_size)]
+        results = await asyncio.gather(*[self.fetchall(mapper.statements.select(fields, len(chunk)), chunk)
+                                         for chunk in chunks])
+        for rows in results:
+            if not rows:
+                continue
+            hydrate = self.cache.get_hydrator(fields, rows[0])
+            for row in rows:
+                hydrate(by_id[row[hydrate.id_key]], row)
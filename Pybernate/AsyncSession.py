@@ -0,0 +1,82 @@
+import asyncio
+import inspect
+from contextlib import asynccontextmanager
+from Pybernate.AsyncEntityService import AsyncIdEntityService
+from Pybernate.Exceptions import ServiceAlreadyRegisteredException, NoRegisteredEntityException
+from Pybernate.Statistics import Statistics
+
+
+class AsyncPybernateSession:
+    def __init__(self, pool, maxsize=20, chunk_size=500, slow_query_time=None, n_plus_one_threshold=None,
+                 max_depth=None):
+        self.pool = pool
+        self.conn = None
+        self.lock = asyncio.Lock()
+        self.services = {}
+        self.maxsize = maxsize
+        self.chunk_size = chunk_size
+        self.max_depth = max_depth
+        self.statistics = Statistics("session", slow_query_time=slow_query_time,
+                                     n_plus_one_threshold=n_plus_one_threshold)
+
+    def register_class(self, *args):
+        for clazz in args:
+            clazz_name = clazz.__name__
+            if clazz_name in self.services:
+                raise ServiceAlreadyRegisteredException(clazz_name)
+            clazz.get_mapper()
+            lower_clazz_name = clazz_name.lower()
+            self.services[lower_clazz_name] = AsyncIdEntityService(clazz, self, self.maxsize, chunk_size=self.chunk_size,
+                                                                   max_depth=self.max_depth)
+
+    def get_service(self, service_name):
+        if service_name in self.services:
+            return self.services[service_name]
+        else:
+            raise NoRegisteredEntityException(service_name)
+
+    async def get_write_connection(self):
+        if self.conn is None:
+            self.conn = await self.pool.acquire()
+        return self.conn
+
+    @asynccontextmanager
+    async def read_connection(self):
+        if self.conn is None:
+            async with self.pool.acquire() as conn:
+                yield conn
+        else:
+            async with self.lock:
+                yield self.conn
+
+    async def release(self):
+        if self.conn is not None:
+            conn, self.conn = self.conn, None
+            released = self.pool.release(conn)
+            if inspect.isawaitable(released):
+                await released
+
+    async def flush_caches(self, caches):
+        conn = await self.get_write_connection()
+        async with self.lock:
+            try:
+                async with conn.cursor() as cursor:
+                    for cache in caches:
+                        await cache.write_pending(cursor)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+            finally:
+                await self.release()
+        for cache in caches:
+            cache.mark_flushed()
+
+    async def flush(self):
+        await self.flush_caches([service.cache for service in self.services.values()])
+
+    async def end_session(self):
+        await self.flush()
+        self.statistics.end_session()
+        for service in self.services.values():
+            service.cache.discard()
@@ -0,0 +1,380 @@
+import csv
+import datetime
+import decimal
+import itertools
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Pybernate.Exceptions import BulkTaskException
+from Pybernate.Mapper import get_row_keys
+from Pybernate.Schema import introspect
+from Pybernate.Statements import batch_counts
+
+NULL = "\\N"
+ESCAPE = "\\"
+INTEGER_TYPE = re.compile(r"(tiny|small|medium|big)?(int|integer|serial)\d*\b")
+
+_worker = {}
+
+
+def _init_worker(connect):
+    _worker["connect"] = connect
+    _worker["connection"] = None
+
+
+def _close_worker():
+    connection = _worker.pop("connection", None)
+    if connection is not None:
+        connection.close()
+
+
+def _get_connection(reconnect=False):
+    connection = _worker.get("connection")
+    if reconnect and connection is not None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+        connection = None
+    if connection is None:
+        connection = _worker["connection"] = _worker["connect"]()
+    return connection
+
+
+def _attempt(function, task, retries):
+    for attempt in range(retries + 1):
+        try:
+            return function(_get_connection(attempt > 0), *task)
+        except Exception:
+            if attempt == retries:
+                raise
+
+
+def get_export_fields(clazz):
+    mapper = clazz.get_mapper()
+    return (mapper.id_column,) + tuple(mapper.columns)
+
+
+def encode(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def _from_text(convert):
+    return lambda value: convert(value) if isinstance(value, str) else value
+
+
+def _to_bool(value):
+    return value in ("1", "True", "true") if isinstance(value, str) else bool(value)
+
+
+def _to_bytes(value):
+    return bytes.fromhex(value) if isinstance(value, str) else bytes(value)
+
+
+def get_decoder(column_type):
+    column_type = (column_type or "").lower()
+    if INTEGER_TYPE.match(column_type):
+        return _from_text(int)
+    if column_type.startswith(("real", "float", "double")):
+        return _from_text(float)
+    if column_type.startswith(("decimal", "numeric")):
+        return _from_text(decimal.Decimal)
+    if column_type.startswith("bool"):
+        return _to_bool
+    if "blob" in column_type or "binary" in column_type or column_type == "bytea":
+        return _to_bytes
+    if column_type.startswith(("datetime", "timestamp")):
+        return _from_text(datetime.datetime.fromisoformat)
+    if column_type.startswith("date"):
+        return _from_text(datetime.date.fromisoformat)
+    if column_type.startswith("time"):
+        return _from_text(datetime.time.fromisoformat)
+    return None
+
+
+def get_decoders(connection, dialect, table, fields):
+    types = introspect(connection, dialect, table).types
+    return [get_decoder(types.get(field)) for field in fields]
+
+
+def encode_csv(value):
+    if value is None:
+        return NULL
+    value = encode(value)
+    if isinstance(value, str) and value.startswith(ESCAPE):
+        return ESCAPE + value
+    return value
+
+
+def decode_csv(value):
+    if value == NULL:
+        return None
+    if value.startswith(ESCAPE):
+        return value[1:]
+    return value
+
+
+class CsvWriter:
+    def __init__(self, path, fields):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(fields)
+
+    def write(self, rows):
+        self.writer.writerows([[encode_csv(value) for value in row] for row in rows])
+
+    def close(self):
+        self.file.close()
+
+
+class CsvReader:
+    def __init__(self, path, batch_size):
+        self.file = open(path, newline="")
+        self.reader = csv.reader(self.file)
+        self.fields = tuple(next(self.reader))
+        self.batch_size = batch_size
+
+    def __iter__(self):
+        batch = []
+        for row in self.reader:
+            batch.append([decode_csv(value) for value in row])
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLinesWriter:
+    def __init__(self, path, fields):
+        self.file = open(path, "w")
+        self.fields = fields
+
+    def write(self, rows):
+        self.file.writelines([json.dumps(dict(zip(self.fields, row)), default=encode) + "\n" for row in rows])
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLinesReader:
+    def __init__(self, path, batch_size):
+        self.file = open(path)
+        self.first = self.file.readline()
+        self.fields = tuple(json.loads(self.first)) if self.first else ()
+        self.batch_size = batch_size
+
+    def __iter__(self):
+        batch = []
+        for line in itertools.chain([self.first] if self.first else [], self.file):
+            data = json.loads(line)
+            batch.append([data[field] for field in self.fields])
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, fields):
+        import pyarrow
+        import pyarrow.parquet
+        self.pyarrow = pyarrow
+        self.path = path
+        self.fields = fields
+        self.writer = None
+
+    def write(self, rows):
+        columns = {field: [row[index] for row in rows] for index, field in enumerate(self.fields)}
+        table = self.pyarrow.table(columns)
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is None:
+            self.pyarrow.parquet.write_table(self.pyarrow.table({field: [] for field in self.fields}), self.path)
+        else:
+            self.writer.close()
+
+
+class ParquetReader:
+    def __init__(self, path, batch_size):
+        import pyarrow.parquet
+        self.file = pyarrow.parquet.ParquetFile(path)
+        self.fields = tuple(self.file.schema_arrow.names)
+        self.batch_size = batch_size
+
+    def __iter__(self):
+        for batch in self.file.iter_batches(self.batch_size):
+            yield [list(row) for row in zip(*[column.to_pylist() for column in batch.columns])]
+
+    def close(self):
+        self.file.close()
+
+
+FORMATS = {"csv": (CsvWriter, CsvReader), "jsonl": (JsonLinesWriter, JsonLinesReader),
+           "parquet": (ParquetWriter, ParquetReader)}
+
+
+def _export_partition(connection, clazz, dialect, file_format, low, high, path, batch_size, stream_cursor):
+    statements = clazz.get_mapper().get_statements(dialect)
+    fields = get_export_fields(clazz)
+    temporary = path + ".part"
+    writer = FORMATS[file_format][0](temporary, fields)
+    count = 0
+    try:
+        cursor = connection.cursor(stream_cursor) if stream_cursor is not None else connection.cursor()
+        with cursor:
+            cursor.execute(statements.select_range(fields), [low, high])
+            rows = cursor.fetchmany(batch_size)
+            while rows:
+                keys = get_row_keys(fields, rows[0])
+                writer.write([[row[key] for key in keys] for row in rows])
+                count += len(rows)
+                rows = cursor.fetchmany(batch_size)
+    finally:
+        writer.close()
+        connection.rollback()
+    os.replace(temporary, path)
+    return count
+
+
+def _import_file(connection, clazz, dialect, file_format, path, batch_size, keep_ids):
+    mapper = clazz.get_mapper()
+    statements = mapper.get_statements(dialect)
+    reader = FORMATS[file_format][1](path, batch_size)
+    count = 0
+    try:
+        fields = reader.fields
+        positions = [index for index, field in enumerate(fields)
+                     if field in mapper.columns or (keep_ids and field == mapper.id_column)]
+        fields = tuple(fields[index] for index in positions)
+        decoders = list(zip(positions, get_decoders(connection, statements.dialect, mapper.table, fields)))
+        limit = max(1, min(batch_size, dialect.max_params // max(1, len(fields))))
+        with connection.cursor() as cursor:
+            for batch in reader:
+                start = 0
+                for size in batch_counts(len(batch), limit):
+                    values = [row[index] if decode is None or row[index] is None else decode(row[index])
+                              for row in batch[start:start + size] for index, decode in decoders]
+                    cursor.execute(statements.insert(fields, size), values)
+                    start += size
+                count += len(batch)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        reader.close()
+    return count
+
+
+class BulkPipeline:
+    def __init__(self, connect, clazz, dialect=None, workers=None, batch_size=10000, retries=3, progress=None):
+        self.connect = connect
+        self.clazz = clazz
+        self.dialect = dialect
+        self.statements = clazz.get_mapper().get_statements(dialect)
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.retries = retries
+        self.progress = progress
+
+    def run(self, function, tasks, names):
+        rows = 0
+        done = 0
+        if self.workers == 1:
+            _init_worker(self.connect)
+            try:
+                for task, name in zip(tasks, names):
+                    try:
+                        rows += _attempt(function, task, self.retries)
+                    except Exception as error:
+                        raise BulkTaskException(name, self.retries + 1) from error
+                    done += 1
+                    if self.progress is not None:
+                        self.progress(done, len(tasks), rows)
+            finally:
+                _close_worker()
+            return rows
+        with ProcessPoolExecutor(min(self.workers, max(1, len(tasks))), initializer=_init_worker,
+                                 initargs=(self.connect,)) as executor:
+            futures = {executor.submit(_attempt, function, task, self.retries): name
+                       for task, name in zip(tasks, names)}
+            for future in as_completed(futures):
+                try:
+                    rows += future.result()
+                except Exception as error:
+                    for other in futures:
+                        other.cancel()
+                    raise BulkTaskException(futures[future], self.retries + 1) from error
+                done += 1
+                if self.progress is not None:
+                    self.progress(done, len(tasks), rows)
+        return rows
+
+
+class BulkExporter(BulkPipeline):
+    def __init__(self, connect, clazz, dialect=None, workers=None, batch_size=10000, retries=3, progress=None,
+                 stream_cursor=None):
+        super().__init__(connect, clazz, dialect, workers, batch_size, retries, progress)
+        self.stream_cursor = stream_cursor
+
+    def get_bounds(self):
+        connection = self.connect()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(self.statements.select_bounds(), [])
+                row = cursor.fetchone()
+            connection.rollback()
+        finally:
+            connection.close()
+        low_key, high_key = get_row_keys(("low", "high"), row)
+        return row[low_key], row[high_key]
+
+    def get_partitions(self, partition_size):
+        low, high = self.get_bounds()
+        if low is None:
+            return []
+        return [(start, start + partition_size) for start in range(low, high + 1, partition_size)]
+
+    def export(self, directory, file_format="csv", partition_size=100000, resume=False):
+        if file_format not in FORMATS:
+            raise ValueError("file_format must be one of {}".format(", ".join(FORMATS)))
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        tasks = []
+        for index, (low, high) in enumerate(self.get_partitions(partition_size)):
+            path = os.path.join(directory, "{}-{:05d}.{}".format(self.statements.table, index, file_format))
+            paths.append(path)
+            if not (resume and os.path.exists(path)):
+                tasks.append((self.clazz, self.statements.dialect, file_format, low, high, path, self.batch_size,
+                              self.stream_cursor))
+        self.run(_export_partition, tasks, [task[5] for task in tasks])
+        return paths
+
+
+class BulkImporter(BulkPipeline):
+    def import_files(self, paths, file_format=None, keep_ids=True):
+        tasks = []
+        for path in paths:
+            path_format = file_format or os.path.splitext(path)[1][1:]
+            if path_format not in FORMATS:
+                raise ValueError("file_format must be one of {}".format(", ".join(FORMATS)))
+            tasks.append((self.clazz, self.statements.dialect, path_format, path, self.batch_size, keep_ids))
+        return self.run(_import_file, tasks, list(paths))
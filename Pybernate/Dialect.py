@@ -0,0 +1,80 @@
+def adapt_row(cursor, row):
+    if row is None or isinstance(row, dict):
+        return row
+    return dict(zip([description[0] for description in cursor.description], row))
+
+
+def adapt_rows(cursor, rows):
+    if not rows or isinstance(rows[0], dict):
+        return rows
+    names = [description[0] for description in cursor.description]
+    return [dict(zip(names, row)) for row in rows]
+
+
+class Dialect:
+    name = None
+    placeholder = "%s"
+    quote_char = '"'
+    returning = False
+    lastrowid = "first"
+    max_params = 65535
+    default_values = "DEFAULT VALUES"
+    columns_query = ("SELECT column_name AS name, data_type AS type FROM information_schema.columns "
+                     "WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position")
+
+    def quote(self, name):
+        return "{0}{1}{0}".format(self.quote_char, name)
+
+    def format(self, statement):
+        if self.placeholder == "%s":
+            return statement
+        return statement.replace("%s", self.placeholder)
+
+    def get_columns_query(self):
+        return self.format(self.columns_query)
+
+    def get_max_in(self):
+        return 1 << (self.max_params.bit_length() - 1)
+
+    def get_max_insert_rows(self, fields):
+        if not fields and self.default_values is not None:
+            return 1
+        return self.max_params // (len(fields) + 1)
+
+    def get_insert_suffix(self, id_column):
+        return " RETURNING {}".format(self.quote(id_column)) if self.returning else ""
+
+    def get_insert_ids(self, cursor, count, id_column):
+        if self.returning:
+            return [row[id_column] for row in adapt_rows(cursor, cursor.fetchall())]
+        if self.lastrowid == "last":
+            return range(cursor.lastrowid - count + 1, cursor.lastrowid + 1)
+        return range(cursor.lastrowid, cursor.lastrowid + count)
+
+    def __eq__(self, other):
+        return type(self) is type(other)
+
+    def __hash__(self):
+        return hash(type(self))
+
+
+class MySQLDialect(Dialect):
+    name = "mysql"
+    quote_char = "`"
+    default_values = None
+    columns_query = ("SELECT COLUMN_NAME AS name, DATA_TYPE AS type FROM information_schema.COLUMNS "
+                     "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION")
+
+
+class SQLiteDialect(Dialect):
+    name = "sqlite"
+    placeholder = "?"
+    lastrowid = "last"
+    max_params = 999
+    columns_query = "SELECT name, type FROM pragma_table_info(%s) ORDER BY cid"
+
+
+class PostgreSQLDialect(Dialect):
+    name = "postgresql"
+    returning = True
+    lastrowid = None
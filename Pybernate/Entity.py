@@ -1,6 +1,10 @@
+import sys
 from Pybernate.Exceptions import LazyInitializationException
+from Pybernate.Mapper import get_mapper
 
 class Entity:
+    __slots__ = ("deleted", "dirty", "initialized")
+
     def __init__(self):
         self.deleted = False
         self.dirty = False
@@ -24,49 +28,86 @@ class Entity:
     def get_initialized(self):
         return self.initialized
 
-    def rollback(self):
-        pass
+    def get_snapshot(self):
+        return self.deleted, self.dirty, self.initialized
+
+    def rollback(self, snapshot):
+        self.deleted, self.dirty, self.initialized = snapshot
 
 class IdEntity(Entity):
+    __slots__ = ("id", "values", "unloaded", "original", "group", "new")
+
     def __init__(self, **kwargs):
         super().__init__()
-        self.id = None
-        self.table = self.get_subclass_name().lower()
-        self.lazies = set()
-        self.transients = set()
-        self.elements = {}
+        mapper = self.get_mapper()
+        self.id = kwargs.pop(mapper.id_column, None)
+        self.new = True
+        self.dirty = 0
+        self.original = None
+        self.group = None
+        self.values = [None] * len(mapper.fields)
+        self.unloaded = mapper.lazy_mask
+        for key in kwargs:
+            if key not in mapper.positions:
+                raise TypeError("{}() got an unexpected keyword argument '{}'".format(self.get_subclass_name(), key))
         self._mixin(kwargs)
-        self.id_column = "id"
-        self.column_names = list(kwargs.keys())
-        self.one_to_many = {}
-        self.many_to_one = {}
-        self.override_methods()
+        self.dirty = mapper.get_mask(kwargs) & mapper.column_mask
+
+    @classmethod
+    def get_mapper(cls):
+        return get_mapper(cls, IdEntity)
+
+    @property
+    def table(self):
+        return self._mapper.table
+
+    @property
+    def id_column(self):
+        return self._mapper.id_column
+
+    @property
+    def transients(self):
+        return self._mapper.transients
+
+    @property
+    def elements(self):
+        return dict(zip(self._mapper.fields, self.values))
 
     def _mixin(self, data):
+        positions = self._mapper.positions
         if isinstance(data, dict):
-            self.lazies -= data.keys()
-            self.elements = {**self.elements, **data}
+            for key, value in data.items():
+                position = positions.get(key)
+                if position is not None:
+                    self.values[position] = value
+                    self.unloaded &= ~(1 << position)
         elif isinstance(data, IdEntity):
-            self.elements[data.table] = data
+            position = positions.get(data.table)
+            if position is not None:
+                self.values[position] = data
+                self.unloaded &= ~(1 << position)
 
+    def set_dirty(self, state):
+        self.dirty = self._mapper.column_mask & ~self.unloaded if state else 0
+        self.original = None
 
-    def set_table(self, table_name):
-        self.table = table_name
-
-    def set_id_column(self, col_name):
-        self.id_column = col_name
+    def get_dirty(self):
+        return self.dirty != 0
 
-    def add_lazy(self, fxn):
-        self.lazies.add(fxn[4:])
+    def _set_new(self, state):
+        self.new = state
 
-    def add_transient(self, fxn):
-        self.transients.add(fxn)
+    def _is_new(self):
+        return self.new
 
-    def addOneToMany(self, other_table, join_column):
-        self.one_to_many[other_table[4:]] = join_column
+    def get_snapshot(self):
+        original = dict(self.original) if self.original is not None else None
+        return self.deleted, self.dirty, self.initialized, self.id, self.new, list(self.values), self.unloaded, original
 
-    def addManyToOne(self, other_table, join_column):
-        self.many_to_one[other_table[4:]] = join_column
+    def rollback(self, snapshot):
+        self.deleted, self.dirty, self.initialized, self.id, self.new, values, self.unloaded, original = snapshot
+        self.values = list(values)
+        self.original = dict(original) if original is not None else None
 
     def get_id(self):
         return self.id
@@ -75,88 +116,114 @@ class IdEntity(Entity):
         self.id = id
 
     def init_lazy(self, data):
-        self.id = data[self.id_column]
-        del data[self.id_column]
-        self.elements = data
-        self.column_names = data.keys()
-
-    def get_element_methods(self):
-        return sorted(list(self.get_subclass_methods() - self.transients)) # deterministic for testing
-
-    def override_methods(self):
-        methods = self.get_element_methods()
-        for method in methods:
-            if method.startswith("get_"):
-                method_target = method[4:]
-                getattr(self, method)()
-                if method_target in self.lazies and method_target in self.elements:
-                    self.lazies.remove(method_target)
-                if self.id_column == method_target:
-                    setattr(self, method, lambda: self.get_id())
-                    continue
-                if method in self.transients:
-                    continue
-                setattr(self, method, lambda t=method_target: self.get_element(t))
-                if method_target not in self.elements:
-                    self.set_element(method_target, None)
-            elif method.startswith("set_"):
-                method_target = method[4:]
-                getattr(self, method)(None)
-                if method in self.transients:
-                    continue
-                setattr(self, method, lambda value, x=method_target: self.set_element(x, value))
+        self.id = data.pop(self.id_column)
+        self._mixin(data)
 
     def get_element(self, x):
-        if x in self.lazies:
-            raise LazyInitializationException(x)
-        return self.elements[x]
+        position = self._mapper.positions[x]
+        if self.unloaded >> position & 1:
+            loader = self.group if self._mapper.column_mask >> position & 1 else self.values[position]
+            if loader is not None:
+                loader.initialize(x)
+            if self.unloaded >> position & 1:
+                raise LazyInitializationException(x)
+        return self.values[position]
+
+    def is_loaded(self, x):
+        return not self.unloaded >> self._mapper.positions[x] & 1
 
     def set_element(self, x, value):
-        self.elements[x] = value
-        self.set_dirty(True)
+        position = self._mapper.positions[x]
+        bit = 1 << position
+        if not (self.dirty | self.unloaded) & bit:
+            if self.original is None:
+                self.original = {}
+            self.original[position] = self.values[position]
+        self.values[position] = value
+        self.unloaded &= ~bit
+        self.dirty |= bit
+
+    def get_changed_mask(self):
+        mask = self.dirty & self._mapper.column_mask
+        if self.original is not None:
+            for position, value in self.original.items():
+                if self.values[position] == value:
+                    mask &= ~(1 << position)
+        return mask
+
+    def set_relationship(self, x, value):
+        position = self._mapper.positions[x]
+        self.values[position] = value
+        self.unloaded &= ~(1 << position)
+
+    def set_lazy_relationship(self, x, loader):
+        position = self._mapper.positions[x]
+        self.values[position] = loader
+        self.unloaded |= 1 << position
+
+    def get_insert_fields(self):
+        return self._mapper.get_fields(self.dirty & self._mapper.column_mask)
 
     def get_insert_query(self):
-        names_component = ", ".join(["`" + a + "`" for a in self.column_names])
-        elements_component = ", ".join(["%s "] * len(self.column_names))
-        return "INSERT INTO {} ({}) VALUES ({})".format(self.table,
-                                                        names_component,
-                                                        elements_component)
-    def get_update_query(self):
-        updates = ", ".join(["{} = '{}'".format(key, value) for key, value in self.elements.items()])
-        return "UPDATE {} SET {} WHERE id = {}".format(self.table,
-                                                       updates,
-                                                       self.id)
+        return self._mapper.statements.insert(self.get_insert_fields())
+
+    def get_update_fields(self):
+        return self._mapper.get_fields(self.get_changed_mask() & ~self._mapper.version_mask)
+
+    def get_update_query(self, fields):
+        return self._mapper.statements.update(fields)
+
+    def get_update_values(self, fields):
+        values = self._mapper.dump(fields, [self.get_element(field) for field in fields]) + [self.id]
+        if self._mapper.version_column is not None:
+            values.append(self._get_version())
+        return values
+
+    def _get_version(self):
+        return self.values[self._mapper.positions[self._mapper.version_column]]
+
+    def _init_version(self):
+        if self._mapper.version_column is not None and self._get_version() is None:
+            self._mixin({self._mapper.version_column: 0})
+            self.dirty |= self._mapper.version_mask
+
+    def _increment_version(self):
+        self.values[self._mapper.positions[self._mapper.version_column]] += 1
 
     def get_initialize_query(self, attribute):
-        return "SELECT {} FROM {} WHERE {} = {}".format(attribute, self.table, self.id_column, self.id)
+        return self._mapper.statements.select([attribute])
 
     def get_delete_query(self):
-        return "DELETE FROM {} WHERE {} = {}".format(self.table, self.id_column, self.id)
+        return self._mapper.statements.delete()
 
     def get_select_all_query(self):
-        return "SELECT * FROM {} WHERE {} = {}".format(self.table, self.id_column, self.id)
+        return self._mapper.statements.select_all()
 
     def get_eager_fields(self):
-        return self.elements.keys() - self.lazies - self.transients - self.one_to_many.keys() - self.many_to_one.keys()
+        return self._mapper.get_fields(self._mapper.column_mask & ~self.unloaded)
 
     def get_many_to_one_relationships(self):
-        return self.many_to_one
+        return self._mapper.many_to_one
 
     def get_one_to_many_relationships(self):
-        return self.one_to_many
+        return self._mapper.one_to_many
+
+    def get_select_lazy_fields(self):
+        return self.get_eager_fields() + [self.id_column]
 
     def get_select_lazy_query(self):
-        fields = self.get_eager_fields()
-        fields.add(self.id_column)
-        eager_fields = ", ".join(fields)
-        return "SELECT {} FROM {} WHERE {} = {}".format(eager_fields, self.table, self.id_column, self.id)
+        return self._mapper.statements.select(self.get_select_lazy_fields())
 
     def get_raw_elements(self):
-        return [self.elements[k] for k in self.column_names]
+        fields = self.get_insert_fields()
+        return self._mapper.dump(fields, [self.get_element(k) for k in fields])
+
+    def _estimated_size(self):
+        size = sys.getsizeof(self) + sys.getsizeof(self.values)
+        for value in self.values:
+            if not isinstance(value, IdEntity):
+                size += sys.getsizeof(value)
+        return size
 
     def get_subclass_name(self):
         return self.__class__.__name__
-
-    def get_subclass_methods(self):
-        return {func for func in dir(self.__class__) if callable(getattr(self.__class__, func))} \
-               - {func for func in dir(IdEntity) if callable(getattr(IdEntity, func))}
\ No newline at end of file
@@ -1,46 +1,274 @@
-from Pybernate.Exceptions import NoMatchingSchemaException, NoSuchEntityException, InvalidEntityServiceException
-from cachetools import LFUCache
-from collections import Iterable
+import time
+from Pybernate.Dialect import MySQLDialect
+from Pybernate.Exceptions import NoMatchingSchemaException, NoSuchEntityException, InvalidEntityServiceException, \
+    StaleObjectException
+from Pybernate.IdGenerator import AutoIncrementGenerator
+from Pybernate.LazyCollection import LazyCollection
+from Pybernate.Mapper import get_row_keys
+from Pybernate.Query import Query
+from Pybernate.Statistics import Statistics
+from Pybernate.Statements import pad_values, batch_counts
+from cachetools import Cache, LFUCache, LRUCache, TTLCache
+from collections.abc import Iterable
+
+
+class PreparedCursors(LRUCache):
+    def popitem(self):
+        query, cursor = super().popitem()
+        cursor.close()
+        return query, cursor
 
 
 class SafeExecutor:
-    def __init__(self, name):
+    def __init__(self, name, connection=None, prepared=False, statistics=None, dialect=None, max_prepared=100):
         self.name = name
+        self.connection = connection
+        self.prepared = prepared
+        self.max_prepared = max_prepared
+        self.prepared_cursors = PreparedCursors(max_prepared)
+        self.statistics = statistics or Statistics(name)
+        self.dialect = dialect or MySQLDialect()
+
+    def get_cursor(self, cursor, query):
+        if not self.prepared:
+            return cursor
+        prepared_cursor = self.prepared_cursors.get(query)
+        if prepared_cursor is None:
+            try:
+                prepared_cursor = self.connection.cursor(prepared=True, dictionary=True)
+            except TypeError:
+                self.prepared = False
+                return cursor
+            self.prepared_cursors[query] = prepared_cursor
+        return prepared_cursor
 
     def execute(self, cursor, query, values):
+        cursor = self.get_cursor(cursor, query)
+        start = time.perf_counter()
         try:
             cursor.execute(query, values)
         except Exception:
             raise NoMatchingSchemaException(self.name)
+        self.statistics.record_statement(self.name, query, values, time.perf_counter() - start, cursor.rowcount)
+        return cursor
+
+    def executemany(self, cursor, query, values):
+        cursor = self.get_cursor(cursor, query)
+        start = time.perf_counter()
+        try:
+            cursor.executemany(query, values)
+        except Exception:
+            raise NoMatchingSchemaException(self.name)
+        self.statistics.record_statement(self.name, query, values, time.perf_counter() - start, cursor.rowcount)
+        return cursor
+
+    def close(self):
+        for cursor in self.prepared_cursors.values():
+            cursor.close()
+        self.prepared_cursors = PreparedCursors(self.max_prepared)
+
+    def bind(self, connection):
+        self.close()
+        self.connection = connection
+
+
+def get_key(entity, column):
+    return entity.get_id() if column == entity.id_column else entity.get_element(column)
+
+
+def set_one_to_many(entity, name, loaded_entities, mapped_by):
+    [loaded_entity._mixin(entity) for loaded_entity in loaded_entities]
+    if mapped_by is not None:
+        mapped_entities = {}
+        for loaded_entity in loaded_entities:
+            mapped_entities[loaded_entity.get_element(mapped_by)] = loaded_entity
+        entity.set_relationship(name, mapped_entities)
+    else:
+        entity.set_relationship(name, loaded_entities)
+
+
+def flush_caches(connection, caches, commit=True):
+    try:
+        with connection.cursor() as cursor:
+            for cache in caches:
+                cache.write_pending(cursor)
+        if commit:
+            connection.commit()
+    except Exception:
+        if commit:
+            connection.rollback()
+        raise
+    for cache in caches:
+        cache.mark_flushed()
+
+
+class LazyGroup:
+    __slots__ = ("service", "entities")
+
+    def __init__(self, service, entities):
+        self.service = service
+        self.entities = entities
+
+    def initialize(self, attribute):
+        self.service.initialize([entity for entity in self.entities if not entity.is_loaded(attribute)], attribute)
+
+
+def get_fetch_plan(paths):
+    if paths is None:
+        return None
+    plan = {}
+    for path in paths:
+        node = plan
+        for name in path.split("."):
+            node = node.setdefault(name, {})
+    return plan
+
+
+class LoadContext:
+    __slots__ = ("max_depth", "visited")
+
+    def __init__(self, max_depth=None):
+        self.max_depth = max_depth
+        self.visited = set()
+
+    def visit(self, entities):
+        unvisited = []
+        for entity in entities:
+            if id(entity) not in self.visited:
+                self.visited.add(id(entity))
+                unvisited.append(entity)
+        return unvisited
+
+    def follows(self, depth, plan, name):
+        return (self.max_depth is None or depth < self.max_depth) and (plan is None or name in plan)
+
+
+class LazyRelationship:
+    __slots__ = ("service", "entities", "max_depth")
+
+    def __init__(self, service, entities, max_depth):
+        self.service = service
+        self.entities = entities
+        self.max_depth = max_depth
 
+    def initialize(self, name):
+        self.service.load_relationship([entity for entity in self.entities if not entity.is_loaded(name)], name,
+                                       self.max_depth)
 
-class EntityCache(LFUCache):
-    def __init__(self, maxsize, connection, clazz, safe_executor):
-        super(EntityCache, self).__init__(maxsize)
+
+class EntityCache(Cache):
+    def __init__(self, maxsize, connection, clazz, safe_executor, chunk_size=500, second_level_cache=None,
+                 batch_size=500, id_generator=None, maxbytes=None, **policy_args):
+        if maxbytes is None:
+            super(EntityCache, self).__init__(maxsize, **policy_args)
+        else:
+            super(EntityCache, self).__init__(maxbytes, getsizeof=lambda entity: entity._estimated_size(),
+                                              **policy_args)
+        self.maxcount = maxsize
+        self.maxbytes = maxbytes
+        self.pending = {}
+        self.inserted = None
         self.connection = connection
         self.clazz = clazz
         self.safe_executor = safe_executor
+        self.dialect = safe_executor.dialect
+        self.chunk_size = min(chunk_size, self.dialect.get_max_in())
+        self.batch_size = batch_size
+        self.id_generator = id_generator or AutoIncrementGenerator()
+        self.statements = clazz.get_mapper().get_statements(self.dialect)
+        self.statistics = safe_executor.statistics
+        self.region = second_level_cache.get_region(clazz) if second_level_cache is not None else None
+        self.read_stamp = 0
+
+    def begin_read(self):
+        if self.region is not None:
+            self.read_stamp = self.region.get_stamp()
 
     def get_cursor(self):
         return self.connection.cursor()
 
+    def get_hydrator(self, fields, row, offset=0, prefix=""):
+        return self.statements.mapper.get_row_hydrator(fields, row, offset, prefix)
+
     def _by_id(self, id, cursor):
-        entity = self.clazz()
-        entity.set_id(id)
-        try:
-            cursor.execute(entity.get_select_lazy_query())
-        except Exception:
-            raise NoMatchingSchemaException(self.clazz.__name__)
-        data = cursor.fetchone()
-        if data == None:
+        self.begin_read()
+        cursor = self.safe_executor.execute(cursor, self.statements.select_lazy(), [id])
+        row = cursor.fetchone()
+        if row is None:
             raise NoSuchEntityException(self.clazz.__name__, id)
-        entity.init_lazy(data)
-        entity.set_initialized(False)
+        return self._load(None, row, self.get_hydrator(self.statements.lazy_fields, row))
+
+    def _load(self, entity, row, hydrate):
+        entity = self._hydrate(entity, row, hydrate)
+        if self.region is not None:
+            self.region.set(entity.get_id(), {field: row[key] for field, key in zip(hydrate.fields, hydrate.keys)},
+                            self.read_stamp)
+        return entity
+
+    def _hydrate(self, entity, row, hydrate):
+        self.statistics.record_hydration()
+        if entity is None:
+            entity = hydrate.create(row)
+        else:
+            hydrate(entity, row)
+            entity.set_dirty(False)
+            entity.set_initialized(False)
         self.cache(entity.get_id(), entity)
         return entity
 
-    def get_by_id(self, id):
+    def load(self, row, hydrate):
+        entity = self.get_tracked(row[hydrate.id_key])
+        if entity is None:
+            entity = self._load(None, row, hydrate)
+        return entity
+
+    def load_detached(self, row, hydrate):
+        entity = self.get_tracked(row[hydrate.id_key])
+        if entity is None:
+            self.statistics.record_hydration()
+            entity = hydrate.create(row)
+            entity.unloaded |= self.statements.mapper.relationship_mask
+        return entity
+
+    def get_tracked(self, id):
         entity = self.get(id, None)
+        if entity is None:
+            entity = self.pending.get(id)
+        return entity
+
+    def get_cached(self, id):
+        entity = self.get_tracked(id)
+        if entity is not None:
+            self.statistics.record_hit()
+        elif self.region is not None:
+            data = self.region.get(id)
+            if data is not None:
+                self.statistics.record_hit(True)
+                fields = tuple(data)
+                entity = self._hydrate(None, data, self.statements.mapper.get_hydrator(fields, fields))
+        if entity is None:
+            self.statistics.record_miss()
+        return entity
+
+    def evict(self, entity):
+        if self.region is not None:
+            self.region.delete(entity.get_id())
+
+    def _by_ids(self, ids, cursor, loaded):
+        values = pad_values(ids)
+        cursor = self.safe_executor.execute(cursor, self.statements.select_lazy(len(values)), values)
+        rows = cursor.fetchall()
+        if rows:
+            hydrate = self.get_hydrator(self.statements.lazy_fields, rows[0])
+            for row in rows:
+                entity = self._load(None, row, hydrate)
+                loaded[entity.get_id()] = entity
+        for id in ids:
+            if id not in loaded:
+                raise NoSuchEntityException(self.clazz.__name__, id)
+
+    def get_by_id(self, id):
+        entity = self.get_cached(id)
         if entity is not None:
             if entity.get_deleted():
                 raise NoSuchEntityException(self.clazz.__name__, id)
@@ -48,31 +276,111 @@ class EntityCache(LFUCache):
         with self.connection.cursor() as cursor:
             return self._by_id(id, cursor)
 
-    def get_by_ids(self, ids): # todo optimize
-        entities = []
-        with self.connection.cursor() as cursor:
-            for id in ids:
-                entities.append(self._by_id(id, cursor))
-        return entities
+    def get_by_ids(self, ids, load=None):
+        load = load or self._by_ids
+        loaded = {}
+        missing = []
+        for id in ids:
+            if id in loaded:
+                continue
+            entity = self.get_cached(id)
+            if entity is None:
+                if id not in missing:
+                    missing.append(id)
+                continue
+            if entity.get_deleted():
+                raise NoSuchEntityException(self.clazz.__name__, id)
+            loaded[id] = entity
+        if missing:
+            self.begin_read()
+            with self.connection.cursor() as cursor:
+                for start in range(0, len(missing), self.chunk_size):
+                    load(missing[start:start + self.chunk_size], cursor, loaded)
+        return [loaded[id] for id in ids]
 
-    def _set(self, entity, cursor):
-        if entity.id is None:
-            self.safe_executor.execute(cursor, entity.get_insert_query(), entity.get_raw_elements())
-            entity.id = cursor.lastrowid
-        else:
+    def get_by_column(self, column, keys):
+        related = []
+        if column == self.statements.mapper.id_column:
+            missing = []
+            for key in keys:
+                entity = self.get_cached(key)
+                if entity is None:
+                    missing.append(key)
+                elif not entity.get_deleted():
+                    related.append((key, entity))
+            keys = missing
+        if keys:
+            self.begin_read()
+            with self.connection.cursor() as cursor:
+                for start in range(0, len(keys), self.chunk_size):
+                    values = pad_values(keys[start:start + self.chunk_size])
+                    cursor = self.safe_executor.execute(cursor, self.statements.select_by(column, len(values)), values)
+                    rows = cursor.fetchall()
+                    if not rows:
+                        continue
+                    fields = self.statements.get_select_by_fields(column)
+                    hydrate = self.get_hydrator(fields, rows[0])
+                    column_key = hydrate.keys[fields.index(column)]
+                    for row in rows:
+                        entity = self.load(row, hydrate)
+                        if not entity.get_deleted():
+                            related.append((row[column_key], entity))
+        return related
+
+    def _insert(self, entities, cursor):
+        groups = {}
+        for entity in entities:
+            entity._init_version()
+            groups.setdefault((tuple(entity.get_insert_fields()), entity.id is not None), []).append(entity)
+        id_column = self.statements.mapper.id_column
+        for (fields, explicit), group in groups.items():
+            if explicit:
+                generated = [entity.id for entity in group]
+            else:
+                generated = self.id_generator.generate(self.statements.table, len(group))
+            batch_size = max(1, min(self.batch_size, self.dialect.get_max_insert_rows(fields)))
+            start = 0
+            for count in batch_counts(len(group), batch_size):
+                batch = group[start:start + count]
+                if generated is None:
+                    values = [value for entity in batch for value in entity.get_raw_elements()]
+                    cursor = self.safe_executor.execute(cursor, self.statements.insert(fields, count), values)
+                    ids = self.dialect.get_insert_ids(cursor, count, id_column)
+                else:
+                    ids = generated[start:start + count]
+                    values = [value for id, entity in zip(ids, batch) for value in [id] + entity.get_raw_elements()]
+                    cursor = self.safe_executor.execute(cursor, self.statements.insert((id_column,) + fields, count),
+                                                        values)
+                start += count
+                if self.inserted is not None:
+                    self.inserted.extend([(entity, entity.id, entity.dirty) for entity in batch])
+                for id, entity in zip(ids, batch):
+                    entity.id = id
+                    entity._set_new(False)
+                    entity.set_dirty(False)
+                    self.cache(id, entity)
+
+    def _set(self, entity):
+        if self.get_tracked(entity.id) is not entity:
             entity.set_dirty(True)
         self.cache(entity.id, entity)
 
     def set(self, to_set):
         if isinstance(to_set, self.clazz):
-            with self.connection.cursor() as cursor:
-                self._set(to_set, cursor)
+            to_set = [to_set]
         elif isinstance(to_set, Iterable):
-            with self.connection.cursor() as cursor:
-                for entity_to_set in to_set:
-                    self._set(entity_to_set, cursor)
+            to_set = list(to_set)
         else:
             raise InvalidEntityServiceException(to_set.__class__.__name__, self.clazz.__name__)
+        new_entities = []
+        for entity in to_set:
+            if entity._is_new():
+                new_entities.append(entity)
+            else:
+                self._set(entity)
+        if new_entities:
+            with self.connection.cursor() as cursor:
+                self._insert(new_entities, cursor)
 
     def _delete(self, to_delete):
         to_delete.set_deleted(True)
@@ -88,34 +396,237 @@ class EntityCache(LFUCache):
 
     def popitem(self):
         key, entity = super().popitem()
-        with self.connection.cursor() as cursor:
-            if entity.get_deleted():
-                self.safe_executor.execute(cursor, entity.get_delete_query(), ())
-            elif entity.get_dirty():
-                self.safe_executor.execute(cursor, entity.get_update_query(), ())
+        self.statistics.record_eviction()
+        self.queue(key, entity)
+        return key, entity
+
+    def queue(self, key, entity):
+        if entity.get_deleted() or entity.get_dirty():
+            self.pending[key] = entity
 
     def cache(self, key, value):
+        if self.maxbytes is not None:
+            if self.getsizeof(value) > self.maxbytes:
+                self.pop(key, None)
+                self.pending[key] = value
+                return
+            while key not in self and len(self) >= self.maxcount:
+                self.popitem()
         super().__setitem__(key, value)
+        if self.pending.get(key) is value:
+            del self.pending[key]
+
+    def get_pending_writes(self, entities):
+        versioned = self.statements.mapper.version_column is not None
+        deleted = []
+        updates = {}
+        for entity in entities:
+            if entity.get_deleted():
+                if entity.get_id() is not None:
+                    deleted.append(entity)
+            elif entity.get_dirty():
+                fields = entity.get_update_fields()
+                if fields:
+                    values, ids = updates.setdefault(self.statements.update(fields), ([], []))
+                    values.append(entity.get_update_values(fields))
+                    ids.append(entity.get_id())
+        writes = [("executemany", query, values, ids if versioned else None)
+                  for query, (values, ids) in updates.items()]
+        if versioned and deleted:
+            writes.append(("executemany", self.statements.delete_versioned(),
+                           [[entity.get_id(), entity._get_version()] for entity in deleted],
+                           [entity.get_id() for entity in deleted]))
+        elif deleted:
+            deleted_ids = [entity.get_id() for entity in deleted]
+            for start in range(0, len(deleted_ids), self.chunk_size):
+                values = pad_values(deleted_ids[start:start + self.chunk_size])
+                writes.append(("execute", self.statements.delete(len(values)), values, None))
+        return writes
+
+    def check_rowcount(self, cursor, ids):
+        if ids is not None and cursor.rowcount != len(ids):
+            raise StaleObjectException(self.clazz.__name__, ids)
 
-    # todo: not efficient to call popitem and get a cursor for each element
-    def flush(self):
+    def get_flush_entities(self):
+        return list(self.values()) + list(self.pending.values())
+
+    def write_pending(self, cursor):
+        for method, query, values, ids in self.get_pending_writes(self.get_flush_entities()):
+            self.check_rowcount(getattr(self.safe_executor, method)(cursor, query, values), ids)
+
+    def mark_clean(self, entity):
+        if self.statements.mapper.version_column is not None and not entity.get_deleted() \
+                and entity.get_dirty() and entity.get_update_fields():
+            entity._increment_version()
+        entity.set_dirty(False)
+
+    def mark_flushed(self):
+        for entity in self.pending.values():
+            self.evict(entity)
+            self.mark_clean(entity)
+        self.pending = {}
+        for key, entity in list(self.items()):
+            if entity.get_deleted() or entity.get_dirty():
+                self.evict(entity)
+            if entity.get_deleted():
+                del self[key]
+            else:
+                self.mark_clean(entity)
+
+    def refresh(self, entities):
+        mapper = self.statements.mapper
+        by_id = {entity.get_id(): entity for entity in entities if entity.get_id() is not None}
+        ids = list(by_id)
+        stale = by_id
+        self.begin_read()
+        with self.connection.cursor() as cursor:
+            if mapper.version_column is not None:
+                versions = {}
+                fields = (mapper.id_column, mapper.version_column)
+                for start in range(0, len(ids), self.chunk_size):
+                    values = pad_values(ids[start:start + self.chunk_size])
+                    cursor = self.safe_executor.execute(cursor, self.statements.select(fields, len(values)), values)
+                    rows = cursor.fetchall()
+                    if rows:
+                        id_key, version_key = get_row_keys(fields, rows[0])
+                        for row in rows:
+                            versions[row[id_key]] = row[version_key]
+                stale = {id: entity for id, entity in by_id.items()
+                         if id not in versions or versions[id] != entity._get_version()}
+                ids = list(stale)
+            loaded = {}
+            for start in range(0, len(ids), self.chunk_size):
+                values = pad_values(ids[start:start + self.chunk_size])
+                cursor = self.safe_executor.execute(cursor, self.statements.select_lazy(len(values)), values)
+                rows = cursor.fetchall()
+                if not rows:
+                    continue
+                hydrate = self.get_hydrator(self.statements.lazy_fields, rows[0])
+                for row in rows:
+                    entity = stale[row[hydrate.id_key]]
+                    entity.unloaded |= mapper.lazy_mask
+                    entity.set_deleted(False)
+                    loaded[entity.get_id()] = self._load(entity, row, hydrate)
+        missing = [entity for id, entity in stale.items() if id not in loaded]
+        for entity in missing:
+            self.pop(entity.get_id(), None)
+            self.pending.pop(entity.get_id(), None)
+            self.evict(entity)
+        if missing:
+            raise NoSuchEntityException(self.clazz.__name__, missing[0].get_id())
+        return list(loaded.values())
+
+    def flush(self, commit=True):
+        flush_caches(self.connection, [self], commit)
         self.clear()
 
+    def snapshot(self):
+        if self.inserted is None:
+            self.inserted = []
+        entities = list(self.values()) + list(self.pending.values())
+        return len(self.inserted), [(entity, entity.get_snapshot()) for entity in entities]
+
+    def restore(self, snapshot):
+        marker, states = snapshot
+        for entity in list(self.values()) + list(self.pending.values()):
+            self.evict(entity)
+        for entity, id, dirty in self.inserted[marker:]:
+            entity.set_id(id)
+            entity._set_new(True)
+            entity.dirty = dirty
+        del self.inserted[marker:]
+        self.discard()
+        for entity, state in states:
+            entity.rollback(state)
+            self.cache(entity.get_id(), entity)
+
+    def discard(self):
+        for key in list(self.keys()):
+            del self[key]
+        self.pending = {}
+
+
+class LFUEntityCache(EntityCache, LFUCache):
+    pass
+
+
+class LRUEntityCache(EntityCache, LRUCache):
+    pass
+
+
+class TTLEntityCache(EntityCache, TTLCache):
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, entity in expired:
+            self.queue(key, entity)
+        return expired
+
+    def get_tracked(self, id):
+        self.expire()
+        entity = self.get(id, None)
+        if entity is None:
+            entity = self.pending.get(id)
+            if entity is not None:
+                self.cache(id, entity)
+        return entity
+
+    def get_flush_entities(self):
+        self.expire()
+        return super().get_flush_entities()
+
+
+CACHE_POLICIES = {"lfu": LFUEntityCache, "lru": LRUEntityCache, "ttl": TTLEntityCache, "unbounded": EntityCache}
+
 
 class EntityService:
-    def __init__(self, clazz, connection, session, maxsize):
+    def __init__(self, clazz, connection, session, maxsize, chunk_size=500, prepared=False, second_level_cache=None,
+                 batch_size=500, id_generator=None, policy="lfu", maxbytes=None, ttl=300, batch_lazy=False,
+                 max_depth=None, max_prepared=100):
         self.connection = connection
         self.clazz = clazz
         self.session = session
-        self.safe_executor = SafeExecutor(self.get_name())
-        self.cache = EntityCache(maxsize, self.connection, self.clazz, self.safe_executor)
+        self.batch_lazy = batch_lazy
+        self.max_depth = max_depth
+        self.schema = None
+        self.statistics = Statistics(self.get_name(), session.statistics)
+        self.safe_executor = SafeExecutor(self.get_name(), connection, prepared, self.statistics, session.dialect,
+                                          max_prepared)
+        if policy not in CACHE_POLICIES:
+            raise ValueError("policy must be one of {}".format(", ".join(CACHE_POLICIES)))
+        policy_args = {"ttl": ttl} if policy == "ttl" else {}
+        if policy == "unbounded":
+            maxsize = float("inf")
+            maxbytes = None
+        self.cache = CACHE_POLICIES[policy](maxsize, self.connection, self.clazz, self.safe_executor,
+                                            chunk_size=chunk_size, second_level_cache=second_level_cache,
+                                            batch_size=batch_size, id_generator=id_generator, maxbytes=maxbytes,
+                                            **policy_args)
 
     def flush_cache(self):
-        self.cache.flush()
+        self.cache.flush(not self.session.in_transaction)
+
+    def close(self):
+        self.safe_executor.close()
+
+    def bind(self, connection):
+        self.connection = connection
+        self.cache.connection = connection
+        self.safe_executor.bind(connection)
+
+    def clear_cache(self):
+        self.cache.clear()
+
+    def discard_cache(self):
+        self.cache.discard()
 
     def get_conn(self):
         return self.connection.cursor()
 
+    def get_stream_cursor(self):
+        if self.session.stream_cursor is None:
+            return self.connection.cursor()
+        return self.connection.cursor(self.session.stream_cursor)
+
     def get_name(self):
         return self.clazz.__name__
 
@@ -127,56 +638,206 @@ class EntityService:
 
 
 class IdEntityService(EntityService):
-    def by_id(self, entity_id, suppression=None):
-        entity = self.cache.get_by_id(entity_id)
-        if not entity.get_initialized():
-            entity = self._init_one_to_many(entity, suppression)
-            entity = self._init_many_to_one(entity, suppression)
-            self.cache.set(entity)
-        return entity
+    def query(self):
+        return Query(self)
 
+    def project(self, *columns):
+        return Query(self).project(*columns)
 
-    def by_ids(self, entity_ids, suppression=None):
-            return [self.by_id(entity_id, suppression) for entity_id in entity_ids]
+    def by_id(self, entity_id, max_depth=None, fetch=None):
+        return self.by_ids([entity_id], max_depth, fetch)[0]
 
-    def _init_many_to_one(self, entity, suppress_attribute):
-        for other_class, join_column, foreign_key in entity.get_many_to_one_relationships().values():
-            if other_class == suppress_attribute:
-                continue
-            other_service = self.session.services[other_class]
-            this_key = entity.id if join_column is entity.id_column else entity.elements[join_column]
-            loaded_entity = other_service.by_id(this_key, entity.table.lower())
-            loaded_entity._mixin(entity)
-            entity.elements[other_class] = loaded_entity
-        return entity
+    def by_ids(self, entity_ids, max_depth=None, fetch=None):
+        context = LoadContext(self.max_depth if max_depth is None else max_depth)
+        return self._load_ids(entity_ids, context, 0, get_fetch_plan(fetch))
+
+    def _load_ids(self, entity_ids, context, depth, plan):
+        prefetched = {}
+        load = None
+        if self.clazz.get_mapper().join_fetch is not None:
+            load = lambda ids, cursor, loaded: self._by_ids_joined(ids, cursor, loaded, prefetched)
+        entities = self.cache.get_by_ids(entity_ids, load)
+        pending = {entity.get_id(): entity for entity in entities if not entity.get_initialized()}
+        self._init_relationships(list(pending.values()), context, depth, plan, prefetched)
+        return entities
+
+    def load_relationship(self, entities, name, max_depth=None):
+        context = LoadContext(max_depth)
+        self._init_relationship(context.visit(entities), name, context, 0, None, {})
 
-    def _init_one_to_many(self, entity, supress_attribute):
-        for other_class, join_column, foreign_key, mapped_by in entity.get_one_to_many_relationships().values():
-            if other_class == supress_attribute:
+    def _by_ids_joined(self, ids, cursor, loaded, prefetched):
+        mapper = self.clazz.get_mapper()
+        name, other_class, join_column, foreign_key = mapper.join_fetch
+        other_service = self.session.services[other_class]
+        other_statements = other_service.cache.statements
+        values = pad_values(ids)
+        query = self.cache.statements.select_join(name, other_statements, join_column, foreign_key, len(values))
+        other_service.cache.begin_read()
+        cursor = self.safe_executor.execute(cursor, query, values)
+        related = prefetched.setdefault(name, {})
+        rows = cursor.fetchall()
+        if rows:
+            fields = self.cache.statements.lazy_fields
+            hydrate = self.cache.get_hydrator(fields, rows[0])
+            other_hydrate = other_service.cache.get_hydrator(other_statements.lazy_fields, rows[0], len(fields),
+                                                             name + ".")
+        for row in rows:
+            entity = loaded.get(row[hydrate.id_key])
+            if entity is None:
+                entity = self.cache.load(row, hydrate)
+                loaded[entity.get_id()] = entity
+            others = related.setdefault(get_key(entity, join_column), [])
+            if row[other_hydrate.id_key] is not None:
+                other = other_service.cache.load(row, other_hydrate)
+                if not other.get_deleted():
+                    others.append(other)
+        for id in ids:
+            if id not in loaded:
+                raise NoSuchEntityException(self.clazz.__name__, id)
+
+    def _get_related(self, entities, name, other_service, join_column, foreign_key, prefetched, context, depth,
+                     plan):
+        related = dict(prefetched.get(name, {}))
+        keys = []
+        for entity in entities:
+            key = get_key(entity, join_column)
+            if key is not None and key not in related and key not in keys:
+                keys.append(key)
+        for key, other in other_service.cache.get_by_column(foreign_key, keys):
+            related.setdefault(key, []).append(other)
+        pending = {}
+        for others in related.values():
+            for other in others:
+                if not other.get_initialized():
+                    pending[other.get_id()] = other
+        other_service._init_relationships(list(pending.values()), context, depth, plan)
+        return related
+
+    def _init_relationships(self, entities, context, depth, plan, prefetched=None):
+        entities = context.visit(entities)
+        if not entities:
+            return
+        prefetched = prefetched or {}
+        mapper = self.clazz.get_mapper()
+        if self.batch_lazy and mapper.lazies:
+            group = LazyGroup(self, entities)
+            for entity in entities:
+                entity.group = group
+        proxy = None
+        for name in list(mapper.one_to_many) + list(mapper.many_to_one):
+            if context.follows(depth, plan, name):
+                self._init_relationship(entities, name, context, depth, plan, prefetched)
                 continue
+            proxy = proxy or LazyRelationship(self, entities, context.max_depth)
+            for entity in entities:
+                entity.set_lazy_relationship(name, proxy)
+        for entity in entities:
+            entity.set_initialized(True)
+            self.cache.cache(entity.get_id(), entity)
+
+    def _init_relationship(self, entities, name, context, depth, plan, prefetched):
+        mapper = self.clazz.get_mapper()
+        plan = plan[name] if plan is not None else None
+        if name in mapper.one_to_many:
+            other_class, join_column, foreign_key, mapped_by, fetch = mapper.one_to_many[name]
             other_service = self.session.services[other_class]
-            ins = other_service.clazz()
-            this_key = entity.id if join_column is entity.id_column else entity.elements[join_column]
-            q = "SELECT {} FROM {} WHERE {} = {}".format(ins.id_column, ins.table, foreign_key, this_key)
-            with self.get_conn() as cursor:
-                cursor.execute(q)
-                ids = cursor.fetchall()
-            loaded_entities = other_service.by_ids([x[join_column] for x in ids], entity.table.lower())
-            [loaded_entity._mixin(entity) for loaded_entity in loaded_entities]
-            if mapped_by is not None:
-                mapped_entities = {}
-                for loaded_entity in loaded_entities:
-                    mapped_entities[loaded_entity.elements[mapped_by]] = loaded_entity
-                entity.elements[other_class] = mapped_entities
-            else:
-                entity.elements[other_class] = loaded_entities
-        return entity
+            if fetch == "lazy":
+                LazyCollection(self, name, entities, mapped_by, context.max_depth)
+                return
+            if fetch == "select":
+                for entity in entities:
+                    self._init_one_to_many(entity, name, other_service, join_column, foreign_key, mapped_by, context,
+                                           depth + 1, plan)
+                return
+            related = self._get_related(entities, name, other_service, join_column, foreign_key, prefetched, context,
+                                        depth + 1, plan)
+            for entity in entities:
+                set_one_to_many(entity, name, related.get(get_key(entity, join_column), []), mapped_by)
+            return
+        other_class, join_column, foreign_key, fetch = mapper.many_to_one[name]
+        other_service = self.session.services[other_class]
+        if fetch == "select":
+            for entity in entities:
+                self._init_many_to_one(entity, name, other_service, join_column, context, depth + 1, plan)
+            return
+        related = self._get_related(entities, name, other_service, join_column, foreign_key, prefetched, context,
+                                    depth + 1, plan)
+        for entity in entities:
+            key = get_key(entity, join_column)
+            if key is not None and not related.get(key):
+                raise NoSuchEntityException(other_service.get_name(), key)
+            entity.set_relationship(name, related[key][0] if key is not None else None)
+
+    def load_collections(self, name, pending, max_depth=None):
+        other_class, join_column, foreign_key, mapped_by, fetch = self.clazz.get_mapper().one_to_many[name]
+        entities = [entity for entity, collection in pending]
+        context = LoadContext(max_depth)
+        context.visit(entities)
+        related = self._get_related(entities, name, self.session.services[other_class], join_column, foreign_key, {},
+                                    context, 1, None)
+        for entity, collection in pending:
+            others = related.get(get_key(entity, join_column), [])
+            for other in others:
+                other._mixin(entity)
+            collection.fill(others)
+
+    def count_collections(self, name, pending):
+        other_class, join_column, foreign_key, mapped_by, fetch = self.clazz.get_mapper().one_to_many[name]
+        other_service = self.session.services[other_class]
+        keys = list({get_key(entity, join_column) for entity, collection in pending} - {None})
+        counts = {}
+        with self.get_conn() as cursor:
+            for start in range(0, len(keys), self.cache.chunk_size):
+                values = pad_values(keys[start:start + self.cache.chunk_size])
+                query = other_service.cache.statements.count_by(foreign_key, len(values))
+                cursor = self.safe_executor.execute(cursor, query, values)
+                rows = cursor.fetchall()
+                if rows:
+                    key_key, count_key = get_row_keys((foreign_key, "count"), rows[0])
+                    for row in rows:
+                        counts[row[key_key]] = row[count_key]
+        for entity, collection in pending:
+            collection.size = counts.get(get_key(entity, join_column), 0)
+
+    def _init_many_to_one(self, entity, name, other_service, join_column, context, depth, plan):
+        key = get_key(entity, join_column)
+        loaded_entity = other_service._load_ids([key], context, depth, plan)[0] if key is not None else None
+        entity.set_relationship(name, loaded_entity)
+
+    def _init_one_to_many(self, entity, name, other_service, join_column, foreign_key, mapped_by, context, depth,
+                          plan):
+        other_mapper = other_service.clazz.get_mapper()
+        this_key = get_key(entity, join_column)
+        with self.get_conn() as cursor:
+            query = other_service.cache.statements.select_ids_by(foreign_key)
+            cursor = self.safe_executor.execute(cursor, query, [this_key])
+            rows = cursor.fetchall()
+        ids = []
+        if rows:
+            id_key, = get_row_keys((other_mapper.id_column,), rows[0])
+            ids = [row[id_key] for row in rows]
+        loaded_entities = other_service._load_ids(ids, context, depth, plan)
+        set_one_to_many(entity, name, loaded_entities, mapped_by)
 
-    def initialize(self, entity, attribute):
+    def initialize(self, entities, *attributes):
+        if isinstance(entities, self.clazz):
+            entities = [entities]
+        mapper = self.clazz.get_mapper()
+        fields = (attributes or tuple(sorted(mapper.lazies))) + (mapper.id_column,)
+        by_id = {entity.get_id(): entity for entity in entities}
+        ids = list(by_id)
         with self.get_conn() as cursor:
-            cursor.execute(entity.get_initialize_query(attribute))
-            data = cursor.fetchone()
-            entity._mixin(data)
+            for start in range(0, len(ids), self.cache.chunk_size):
+                values = pad_values(ids[start:start + self.cache.chunk_size])
+                cursor = self.safe_executor.execute(cursor, self.cache.statements.select(fields, len(values)), values)
+                rows = cursor.fetchall()
+                if not rows:
+                    continue
+                hydrate = self.cache.get_hydrator(fields, rows[0])
+                for row in rows:
+                    hydrate(by_id[row[hydrate.id_key]], row)
 
-    def refresh(self, entity):
-        raise NotImplementedError
\ No newline at end of file
+    def refresh(self, entities):
+        if isinstance(entities, self.clazz):
+            entities = [entities]
+        return self.cache.refresh(entities)
\ No newline at end of file
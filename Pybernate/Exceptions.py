@@ -18,6 +18,15 @@ class NoMatchingSchemaException(PybernateException):
         return "{} has no matching schema".format(self.name)
 
 
+class SchemaMismatchException(NoMatchingSchemaException):
+    def __init__(self, name, problems):
+        self.name = name
+        self.problems = problems
+
+    def __str__(self):
+        return "{} does not match its table: {}".format(self.name, "; ".join(self.problems))
+
+
 class NoSuchEntityException(PybernateException):
     def __init__(self, name, id):
         self.name = name
@@ -49,4 +58,31 @@ class InvalidEntityServiceException(PybernateException):
         self.service_name = service_name
 
     def __str__(self):
-        return "Attempted to use {} service with entity: {}".format(self.service_name, self.entity_name)
\ No newline at end of file
+        return "Attempted to use {} service with entity: {}".format(self.service_name, self.entity_name)
+
+
+class StaleObjectException(PybernateException):
+    def __init__(self, name, ids):
+        self.name = name
+        self.ids = ids
+
+    def __str__(self):
+        return "{} with one of the ids {} was updated or deleted by another transaction".format(self.name, self.ids)
+
+
+class BulkTaskException(PybernateException):
+    def __init__(self, task, attempts):
+        self.task = task
+        self.attempts = attempts
+
+    def __str__(self):
+        return "Bulk task {} failed after {} attempts".format(self.task, self.attempts)
+
+
+class PoolTimeoutException(PybernateException):
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+
+    def __str__(self):
+        return "No connection available from a pool of {} after {} seconds".format(self.size, self.timeout)
@@ -0,0 +1,48 @@
+import threading
+from Pybernate.Dialect import MySQLDialect, adapt_row
+
+
+class AutoIncrementGenerator:
+    def generate(self, name, count):
+        return None
+
+
+class HiLoGenerator:
+    def __init__(self, pool, max_lo=100, table="pybernate_hilo", dialect=None):
+        self.pool = pool
+        self.dialect = dialect or MySQLDialect()
+        self.max_lo = max_lo
+        self.table = table
+        self.available = {}
+        self.lock = threading.Lock()
+
+    def _format(self, statement):
+        return self.dialect.format(statement.format(self.table))
+
+    def _allocate(self, name, blocks):
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(self._format("UPDATE {} SET next_hi = next_hi + %s WHERE name = %s"), [blocks, name])
+                if cursor.rowcount == 0:
+                    cursor.execute(self._format("INSERT INTO {} (name, next_hi) VALUES (%s, %s)"), [name, blocks])
+                    hi = 0
+                else:
+                    cursor.execute(self._format("SELECT next_hi FROM {} WHERE name = %s"), [name])
+                    hi = adapt_row(cursor, cursor.fetchone())["next_hi"] - blocks
+            conn.commit()
+        return hi
+
+    def generate(self, name, count):
+        with self.lock:
+            available = self.available.get(name, range(0))
+            ids = list(available[:count])
+            available = available[count:]
+            needed = count - len(ids)
+            if needed:
+                blocks = -(-needed // self.max_lo)
+                hi = self._allocate(name, blocks)
+                available = range(hi * self.max_lo + 1, (hi + blocks) * self.max_lo + 1)
+                ids += available[:needed]
+                available = available[needed:]
+            self.available[name] = available
+            return ids
@@ -0,0 +1,88 @@
+import functools
+
+
+def _loading(method):
+    @functools.wraps(method)
+    def load_first(self, *args, **kwargs):
+        if not self.loaded:
+            self.collection.load()
+        return method(self, *args, **kwargs)
+    return load_first
+
+
+class LazyList(list):
+    __slots__ = ("collection", "loaded", "size")
+
+    def __init__(self, collection):
+        super().__init__()
+        self.collection = collection
+        self.loaded = False
+        self.size = None
+
+    def fill(self, entities):
+        self.loaded = True
+        list.extend(self, entities)
+
+    def __len__(self):
+        if not self.loaded:
+            if self.size is None:
+                self.collection.count()
+            return self.size
+        return list.__len__(self)
+
+
+class LazyDict(dict):
+    __slots__ = ("collection", "loaded", "size", "mapped_by")
+
+    def __init__(self, collection, mapped_by):
+        super().__init__()
+        self.collection = collection
+        self.mapped_by = mapped_by
+        self.loaded = False
+        self.size = None
+
+    def fill(self, entities):
+        self.loaded = True
+        dict.update(self, {entity.get_element(self.mapped_by): entity for entity in entities})
+
+    def __len__(self):
+        if not self.loaded:
+            if self.size is None:
+                self.collection.count()
+            return self.size
+        return dict.__len__(self)
+
+
+for name in ("__iter__", "__getitem__", "__setitem__", "__delitem__", "__contains__", "__reversed__", "__eq__",
+             "__ne__", "__lt__", "__le__", "__gt__", "__ge__", "__repr__", "__add__", "__mul__", "__rmul__",
+             "__iadd__", "__imul__", "append", "extend", "insert", "remove", "pop", "clear", "index", "count",
+             "copy", "sort", "reverse"):
+    setattr(LazyList, name, _loading(getattr(list, name)))
+
+for name in ("__iter__", "__getitem__", "__setitem__", "__delitem__", "__contains__", "__reversed__", "__eq__",
+             "__ne__", "__repr__", "__or__", "__ior__", "get", "keys", "values", "items", "pop", "popitem",
+             "setdefault", "update", "clear", "copy"):
+    setattr(LazyDict, name, _loading(getattr(dict, name)))
+
+
+class LazyCollection:
+    __slots__ = ("service", "name", "collections", "max_depth")
+
+    def __init__(self, service, name, entities, mapped_by, max_depth=None):
+        self.service = service
+        self.name = name
+        self.max_depth = max_depth
+        self.collections = []
+        for entity in entities:
+            collection = LazyList(self) if mapped_by is None else LazyDict(self, mapped_by)
+            entity.set_relationship(name, collection)
+            self.collections.append((entity, collection))
+
+    def load(self):
+        pending = [(entity, collection) for entity, collection in self.collections if not collection.loaded]
+        self.service.load_collections(self.name, pending, self.max_depth)
+
+    def count(self):
+        pending = [(entity, collection) for entity, collection in self.collections
+                   if not collection.loaded and collection.size is None]
+        self.service.count_collections(self.name, pending)
@@ -0,0 +1,230 @@
+import functools
+import threading
+from Pybernate.Statements import Statements
+
+_lock = threading.Lock()
+
+
+def get_mapper(clazz, base):
+    mapper = clazz.__dict__.get("_mapper")
+    if mapper is None:
+        with _lock:
+            mapper = clazz.__dict__.get("_mapper")
+            if mapper is None:
+                mapper = Mapper(clazz, base)
+                clazz._mapper = mapper
+    return mapper
+
+
+def get_row_keys(fields, row, offset=0, prefix=""):
+    if isinstance(row, dict):
+        return tuple(prefix + field for field in fields)
+    return tuple(range(offset, offset + len(fields)))
+
+
+def _element_getter(name):
+    def getter(self):
+        return self.get_element(name)
+    return getter
+
+
+def _element_setter(name):
+    def setter(self, value):
+        self.set_element(name, value)
+    return setter
+
+
+def _relationship_setter(name):
+    def setter(self, value):
+        self.set_relationship(name, value)
+    return setter
+
+
+def _id_getter():
+    def getter(self):
+        return self.id
+    return getter
+
+
+def _id_setter():
+    def setter(self, value):
+        self.id = value
+    return setter
+
+
+class Mapper:
+    def __init__(self, clazz, base):
+        self.clazz = clazz
+        self.base = base
+        self.table = clazz.__name__.lower()
+        self.id_column = "id"
+        self.version_column = None
+        self.columns = []
+        self.lazies = set()
+        self.transients = set()
+        self.one_to_many = {}
+        self.many_to_one = {}
+        self.loaders = {}
+        self.dumpers = {}
+        self.hydrators = {}
+        self.cacheable = clazz.__dict__.get("_pybernate_cacheable")
+        getters, setters = self._inspect(base)
+        self.fields = self.columns + list(self.one_to_many) + list(self.many_to_one)
+        self.positions = {field: position for position, field in enumerate(self.fields)}
+        self.column_mask = (1 << len(self.columns)) - 1
+        self.relationship_mask = ((1 << len(self.fields)) - 1) & ~self.column_mask
+        self.lazy_mask = self.get_mask(self.lazies)
+        self.version_mask = self.get_mask([self.version_column] if self.version_column is not None else [])
+        self.join_fetch = self._get_join_fetch()
+        self.statements = Statements(self)
+        self.dialect_statements = {}
+        self._install(getters, setters)
+
+    def get_statements(self, dialect):
+        if dialect is None or dialect == self.statements.dialect:
+            return self.statements
+        statements = self.dialect_statements.get(dialect)
+        if statements is None:
+            statements = self.dialect_statements.setdefault(dialect, Statements(self, dialect))
+        return statements
+
+    def get_hydrator(self, fields, keys):
+        hydrator = self.hydrators.get((fields, keys))
+        if hydrator is None:
+            hydrator = self.hydrators.setdefault((fields, keys), self._compile_hydrator(fields, keys))
+        return hydrator
+
+    def get_row_hydrator(self, fields, row, offset=0, prefix=""):
+        return self.get_hydrator(tuple(fields), get_row_keys(fields, row, offset, prefix))
+
+    def _compile_hydrator(self, fields, keys):
+        namespace = {"clazz": self.clazz, "new": object.__new__}
+        expressions = {}
+        id_expression = "None"
+        for field, key in zip(fields, keys):
+            if field == self.id_column:
+                id_expression = "row[{!r}]".format(key)
+                continue
+            position = self.positions.get(field)
+            if position is None or position >= len(self.columns):
+                continue
+            load = self.loaders.get(field)
+            if load is None:
+                expressions[position] = "row[{!r}]".format(key)
+            else:
+                namespace["load_{}".format(position)] = load
+                expressions[position] = "_load(load_{}, row[{!r}])".format(position, key)
+        namespace["_load"] = lambda load, value: None if value is None else load(value)
+        mask = self.get_mask([self.fields[position] for position in expressions])
+        lines = ["def hydrate(entity, row):", "    values = entity.values"]
+        lines += ["    values[{}] = {}".format(position, expression) for position, expression in expressions.items()]
+        if id_expression != "None":
+            lines.append("    entity.id = " + id_expression)
+        lines.append("    entity.unloaded &= {}".format(~mask))
+        lines.append("    entity.new = False")
+        values = [expressions.get(position, "None") for position in range(len(self.fields))]
+        if self.clazz.__init__ is self.base.__init__:
+            lines += ["def create(row):",
+                      "    entity = new(clazz)",
+                      "    entity.deleted = False",
+                      "    entity.dirty = 0",
+                      "    entity.initialized = False",
+                      "    entity.original = None",
+                      "    entity.group = None",
+                      "    entity.new = False",
+                      "    entity.id = " + id_expression,
+                      "    entity.values = [{}]".format(", ".join(values)),
+                      "    entity.unloaded = {}".format(self.lazy_mask & ~mask),
+                      "    return entity"]
+        else:
+            lines += ["def create(row):",
+                      "    entity = clazz()",
+                      "    hydrate(entity, row)",
+                      "    return entity"]
+        exec(compile("\n".join(lines), "<{} hydrator>".format(self.clazz.__name__), "exec"), namespace)
+        hydrate = namespace["hydrate"]
+        hydrate.create = namespace["create"]
+        hydrate.fields = fields
+        hydrate.keys = keys
+        hydrate.id_key = keys[fields.index(self.id_column)] if self.id_column in fields else None
+        return hydrate
+
+    def dump(self, fields, values):
+        if self.dumpers:
+            for index, field in enumerate(fields):
+                dump = self.dumpers.get(field)
+                if dump is not None and values[index] is not None:
+                    values[index] = dump(values[index])
+        return values
+
+    def get_mask(self, fields):
+        mask = 0
+        for field in fields:
+            mask |= 1 << self.positions[field]
+        return mask
+
+    def get_fields(self, mask):
+        return [column for position, column in enumerate(self.columns) if mask >> position & 1]
+
+    def _get_join_fetch(self):
+        for name, (other_class, join_column, foreign_key, mapped_by, fetch) in self.one_to_many.items():
+            if fetch == "join":
+                return name, other_class, join_column, foreign_key
+        for name, (other_class, join_column, foreign_key, fetch) in self.many_to_one.items():
+            if fetch == "join":
+                return name, other_class, join_column, foreign_key
+        return None
+
+    def _inspect(self, base):
+        reserved = {name for name in dir(base) if callable(getattr(base, name))}
+        getters = {}
+        setters = {}
+        for name in sorted(dir(self.clazz)):  # deterministic for testing
+            method = getattr(self.clazz, name)
+            if name in reserved or not callable(method):
+                continue
+            if getattr(method, "_pybernate_transient", False):
+                self.transients.add(name)
+                continue
+            if hasattr(method, "_pybernate_table"):
+                self.table = method._pybernate_table
+            if name.startswith("get_"):
+                getters[name[4:]] = method
+            elif name.startswith("set_"):
+                setters[name[4:]] = method
+        for target, method in getters.items():
+            if getattr(method, "_pybernate_id", False):
+                self.id_column = target
+            elif hasattr(method, "_pybernate_one_to_many"):
+                self.one_to_many[target] = method._pybernate_one_to_many
+            elif hasattr(method, "_pybernate_many_to_one"):
+                self.many_to_one[target] = method._pybernate_many_to_one
+            else:
+                self.columns.append(target)
+                if getattr(method, "_pybernate_lazy", False):
+                    self.lazies.add(target)
+                if getattr(method, "_pybernate_version", False):
+                    self.version_column = target
+                if hasattr(method, "_pybernate_convert"):
+                    load, dump = method._pybernate_convert
+                    self.loaders[target] = load
+                    if dump is not None:
+                        self.dumpers[target] = dump
+        relationships = self.one_to_many.keys() | self.many_to_one.keys()
+        self.columns += [target for target in setters
+                         if target not in getters and target != self.id_column and target not in relationships]
+        self.columns.sort()
+        return getters, setters
+
+    def _install(self, getters, setters):
+        for target, method in getters.items():
+            getter = _id_getter() if target == self.id_column else _element_getter(target)
+            setattr(self.clazz, "get_" + target, functools.update_wrapper(getter, method))
+        for target, method in setters.items():
+            if target == self.id_column:
+                setter = _id_setter()
+            elif target in self.one_to_many or target in self.many_to_one:
+                setter = _relationship_setter(target)
+            else:
+                setter = _element_setter(target)
+            setattr(self.clazz, "set_" + target, functools.update_wrapper(setter, method))
@@ -0,0 +1,105 @@
+import threading
+import time
+from contextlib import contextmanager
+from Pybernate.Exceptions import PoolTimeoutException
+
+
+class ConnectionPool:
+    def __init__(self, creator, size=5, timeout=30, recycle=3600, pre_ping=True):
+        self.creator = creator
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.idle = []
+        self.checked_out = {}
+        self.created = 0
+        self.condition = threading.Condition()
+
+    def _connect(self):
+        try:
+            conn = self.creator()
+        except Exception:
+            self._release_slot()
+            raise
+        return conn, time.monotonic()
+
+    def _release_slot(self):
+        with self.condition:
+            self.created -= 1
+            self.condition.notify()
+
+    def _discard(self, conn):
+        self._release_slot()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, conn, created_at):
+        if self.recycle is not None and time.monotonic() - created_at > self.recycle:
+            return False
+        if not self.pre_ping:
+            return True
+        try:
+            if hasattr(conn, "ping"):
+                conn.ping(reconnect=False)
+            else:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchall()
+        except Exception:
+            return False
+        return True
+
+    def _get_idle(self, deadline):
+        with self.condition:
+            while True:
+                if self.idle:
+                    return self.idle.pop()
+                if self.created < self.size:
+                    self.created += 1
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutException(self.size, self.timeout)
+                self.condition.wait(remaining)
+
+    def checkout(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            idle = self._get_idle(deadline)
+            if idle is None:
+                conn, created_at = self._connect()
+                break
+            conn, created_at = idle
+            if self._is_usable(conn, created_at):
+                break
+            self._discard(conn)
+        self.checked_out[id(conn)] = created_at
+        return conn
+
+    def checkin(self, conn):
+        created_at = self.checked_out.pop(id(conn))
+        try:
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        with self.condition:
+            self.idle.append((conn, created_at))
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.checkout()
+        try:
+            yield conn
+        finally:
+            self.checkin(conn)
+
+    def dispose(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+        for conn, created_at in idle:
+            self._discard(conn)
@@ -0,0 +1,178 @@
+import functools
+from collections import namedtuple
+from operator import itemgetter
+from Pybernate.Mapper import get_row_keys
+from Pybernate.Statements import pad_values
+
+OPERATORS = ("=", "!=", "<", "<=", ">", ">=", "in", "like")
+
+
+@functools.lru_cache(maxsize=None)
+def get_row_class(name, columns):
+    return namedtuple(name + "Row", columns)
+
+
+class Query:
+    def __init__(self, service):
+        self.service = service
+        self.mapper = service.clazz.get_mapper()
+        self.filters = []
+        self.values = []
+        self.orders = []
+        self.count = None
+        self.keyset = None
+        self.projection = None
+
+    def _check_column(self, column):
+        if column != self.mapper.id_column and column not in self.mapper.columns:
+            raise ValueError("{} is not a mapped column of {}".format(column, self.service.get_name()))
+
+    def filter(self, column, operator, value):
+        self._check_column(column)
+        if operator not in OPERATORS:
+            raise ValueError("operator must be one of {}".format(", ".join(OPERATORS)))
+        if operator == "in":
+            values = list(value)
+            if values:
+                values = pad_values(values)
+            self.filters.append((column, operator, len(values)))
+            self.values += values
+        elif value is None and operator in ("=", "!="):
+            self.filters.append((column, "is" if operator == "=" else "is not", 0))
+        else:
+            self.filters.append((column, operator, 1))
+            self.values.append(value)
+        return self
+
+    def filter_by(self, **kwargs):
+        for column, value in kwargs.items():
+            self.filter(column, "=", value)
+        return self
+
+    def order_by(self, *columns):
+        for column in columns:
+            descending = column.startswith("-")
+            column = column.lstrip("-")
+            self._check_column(column)
+            self.orders.append((column, descending))
+        return self
+
+    def project(self, *columns):
+        for column in columns:
+            self._check_column(column)
+        self.projection = columns
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    def after(self, *values):
+        self.keyset = list(values)
+        return self
+
+    def get_keyset_orders(self):
+        if any(column == self.mapper.id_column for column, descending in self.orders):
+            return tuple(self.orders)
+        return tuple(self.orders) + ((self.mapper.id_column, False),)
+
+    def get_orders(self):
+        return self.get_keyset_orders() if self.keyset is not None else tuple(self.orders)
+
+    def get_query(self, fields, orders, keyset, count):
+        values = list(self.values)
+        if keyset is not None:
+            if len(keyset) != len(orders):
+                raise ValueError("after() needs a value for each of {}".format(", ".join(c for c, d in orders)))
+            for position in range(len(orders)):
+                values += keyset[:position + 1]
+        if count is not None:
+            values.append(count)
+        query = self.service.cache.statements.query(fields, tuple(self.filters), orders, keyset is not None,
+                                                    count is not None)
+        return query, values
+
+    def _fetch(self, fields, count=None):
+        query, values = self.get_query(fields, self.get_orders(), self.keyset, count or self.count)
+        with self.service.get_stream_cursor() as cursor:
+            cursor = self.service.safe_executor.execute(cursor, query, values)
+            rows = cursor.fetchmany(self.service.cache.chunk_size)
+            while rows:
+                yield rows
+                rows = cursor.fetchmany(self.service.cache.chunk_size)
+
+    def __iter__(self):
+        if self.projection is not None:
+            return self.namedtuples()
+        return self.stream()
+
+    def stream(self, count=None):
+        cache = self.service.cache
+        fields = self.mapper.statements.lazy_fields
+        for rows in self._fetch(fields, count):
+            hydrate = cache.get_hydrator(fields, rows[0])
+            for row in rows:
+                entity = cache.load_detached(row, hydrate)
+                if not entity.get_deleted():
+                    yield entity
+
+    def tuples(self):
+        loaders = [self.mapper.loaders.get(column) for column in self.projection]
+        for rows in self._fetch(self.projection):
+            getter = itemgetter(*get_row_keys(self.projection, rows[0]))
+            if any(loaders):
+                for row in rows:
+                    values = getter(row) if len(loaders) > 1 else (getter(row),)
+                    yield tuple(value if load is None or value is None else load(value)
+                                for load, value in zip(loaders, values))
+            elif len(self.projection) == 1:
+                for row in rows:
+                    yield (getter(row),)
+            else:
+                for row in rows:
+                    yield getter(row)
+
+    def namedtuples(self):
+        row_class = get_row_class(self.service.get_name(), self.projection)
+        for row in self.tuples():
+            yield row_class._make(row)
+
+    def columns(self):
+        columns = {column: [] for column in self.projection}
+        appends = [columns[column].append for column in self.projection]
+        for row in self.tuples():
+            for append, value in zip(appends, row):
+                append(value)
+        return columns
+
+    def pages(self, size):
+        orders = self.get_keyset_orders()
+        keyset = self.keyset
+        remaining = self.count
+        cache = self.service.cache
+        fields = self.mapper.statements.lazy_fields
+        fields += tuple(column for column, descending in orders if column not in fields)
+        while remaining is None or remaining > 0:
+            count = size if remaining is None else min(size, remaining)
+            query, values = self.get_query(fields, orders, keyset, count)
+            with self.service.get_conn() as cursor:
+                cursor = self.service.safe_executor.execute(cursor, query, values)
+                rows = cursor.fetchall()
+            if not rows:
+                return
+            hydrate = cache.get_hydrator(fields, rows[0])
+            keyset = [rows[-1][hydrate.keys[fields.index(column)]] for column, descending in orders]
+            page = [cache.load_detached(row, hydrate) for row in rows]
+            yield [entity for entity in page if not entity.get_deleted()]
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(rows) < count:
+                return
+
+    def all(self):
+        return list(self.stream())
+
+    def first(self):
+        for entity in self.stream(1):
+            return entity
+        return None
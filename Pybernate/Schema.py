@@ -0,0 +1,35 @@
+from Pybernate.Dialect import adapt_rows
+from Pybernate.Exceptions import SchemaMismatchException
+
+
+def introspect(connection, dialect, table):
+    with connection.cursor() as cursor:
+        cursor.execute(dialect.get_columns_query(), [table])
+        rows = adapt_rows(cursor, cursor.fetchall())
+    return Schema(table, [(row["name"], row["type"]) for row in rows])
+
+
+def is_integer(column_type):
+    return "int" in column_type.lower()
+
+
+class Schema:
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = [name for name, column_type in columns]
+        self.types = dict(columns)
+
+    def get_problems(self, mapper):
+        if not self.columns:
+            return ["table {} does not exist".format(self.table)]
+        problems = ["column {} does not exist".format(column)
+                    for column in [mapper.id_column] + mapper.columns if column not in self.types]
+        for column in (mapper.id_column, mapper.version_column):
+            if column in self.types and not is_integer(self.types[column]):
+                problems.append("column {} is {}, not an integer".format(column, self.types[column]))
+        return problems
+
+    def validate(self, mapper):
+        problems = self.get_problems(mapper)
+        if problems:
+            raise SchemaMismatchException(mapper.clazz.__name__, problems)
@@ -0,0 +1,82 @@
+import threading
+from cachetools import TTLCache
+
+
+class CacheBackend:
+    def get(self, key):
+        raise NotImplementedError
+
+    def get_stamp(self):
+        raise NotImplementedError
+
+    def set(self, key, value, stamp=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    def __init__(self, maxsize, ttl):
+        self.entries = TTLCache(maxsize, ttl)
+        self.invalidated = TTLCache(maxsize, ttl)
+        self.stamp = 0
+        self.cleared = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def get_stamp(self):
+        with self.lock:
+            return self.stamp
+
+    def set(self, key, value, stamp=None):
+        with self.lock:
+            if stamp is not None and (stamp < self.cleared or self.invalidated.get(key, 0) > stamp):
+                return
+            self.entries[key] = value
+
+    def delete(self, key):
+        with self.lock:
+            self.stamp += 1
+            self.invalidated[key] = self.stamp
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.stamp += 1
+            self.cleared = self.stamp
+            self.entries.clear()
+
+
+class SecondLevelCache:
+    def __init__(self, backend=MemoryBackend):
+        self.backend = backend
+        self.regions = {}
+        self.lock = threading.Lock()
+
+    def get_region(self, clazz):
+        settings = clazz.get_mapper().cacheable
+        if settings is None:
+            return None
+        region = self.regions.get(clazz)
+        if region is None:
+            with self.lock:
+                region = self.regions.get(clazz)
+                if region is None:
+                    region = self.regions[clazz] = self.backend(*settings)
+        return region
+
+    def evict(self, clazz, id):
+        region = self.regions.get(clazz)
+        if region is not None:
+            region.delete(id)
+
+    def clear(self):
+        for region in list(self.regions.values()):
+            region.clear()
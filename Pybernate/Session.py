@@ -1,23 +1,62 @@
-from Pybernate.EntityService import IdEntityService
+import threading
+from contextlib import contextmanager
+from Pybernate.EntityService import IdEntityService, flush_caches
+from Pybernate.Schema import introspect
 from Pybernate.Exceptions import ServiceAlreadyRegisteredException, NoRegisteredEntityException
+from Pybernate.Statistics import Statistics
+from Pybernate.Transaction import Transaction
 
 
 
 # TODO: cache
 class PybernateSession:
-    def __init__(self, conn, maxsize=20):
+    def __init__(self, conn, maxsize=20, chunk_size=500, prepared=False, second_level_cache=None, batch_size=500,
+                 id_generator=None, policy="lfu", maxbytes=None, ttl=300, stream_cursor=None, batch_lazy=False,
+                 slow_query_time=None, n_plus_one_threshold=None, dialect=None, validate_schema=False, max_depth=None,
+                 max_prepared=100):
         self.conn = conn
         self.services = {}
         self.in_transaction = False
+        self.transactions = []
         self.maxsize = maxsize
+        self.chunk_size = chunk_size
+        self.prepared = prepared
+        self.max_prepared = max_prepared
+        self.second_level_cache = second_level_cache
+        self.batch_size = batch_size
+        self.id_generator = id_generator
+        self.stream_cursor = stream_cursor
+        self.dialect = dialect
+        self.validate_schema = validate_schema
+        self.schemas = {}
+        self.statistics = Statistics("session", slow_query_time=slow_query_time,
+                                     n_plus_one_threshold=n_plus_one_threshold)
+        self.service_options = {"maxsize": maxsize, "policy": policy, "maxbytes": maxbytes, "ttl": ttl,
+                                "batch_lazy": batch_lazy, "max_depth": max_depth}
 
-    def register_class(self, *args):
+    def register_class(self, *args, **service_options):
+        options = dict(self.service_options, **service_options)
         for clazz in args:
             clazz_name = clazz.__name__
             if clazz_name in self.services:
                 raise ServiceAlreadyRegisteredException(clazz_name)
+            clazz.get_mapper()
             lower_clazz_name = clazz_name.lower()
-            self.services[lower_clazz_name] = IdEntityService(clazz, self.conn, self, self.maxsize)
+            service = IdEntityService(clazz, self.conn, self, chunk_size=self.chunk_size, prepared=self.prepared,
+                                      max_prepared=self.max_prepared, second_level_cache=self.second_level_cache,
+                                      batch_size=self.batch_size, id_generator=self.id_generator, **options)
+            if self.validate_schema:
+                service.schema = self.get_schema(clazz, service.safe_executor.dialect)
+            self.services[lower_clazz_name] = service
+
+    def get_schema(self, clazz, dialect):
+        mapper = clazz.get_mapper()
+        schema = self.schemas.get(mapper.table)
+        if schema is None:
+            schema = introspect(self.conn, dialect, mapper.table)
+        schema.validate(mapper)
+        self.schemas[mapper.table] = schema
+        return schema
 
     def get_service(self, service_name):
         if service_name in self.services:
@@ -25,6 +64,93 @@ class PybernateSession:
         else:
             raise NoRegisteredEntityException(service_name)
 
+    def flush(self):
+        flush_caches(self.conn, [service.cache for service in self.services.values()], not self.in_transaction)
+
+    @contextmanager
+    def transaction(self):
+        transaction = Transaction(self, len(self.transactions))
+        transaction.begin()
+        self.transactions.append(transaction)
+        self.in_transaction = True
+        try:
+            yield transaction
+        except BaseException:
+            self.transactions.pop()
+            self.in_transaction = bool(self.transactions)
+            transaction.rollback()
+            raise
+        self.transactions.pop()
+        self.in_transaction = bool(self.transactions)
+        transaction.commit()
+
     def end_session(self):
+        self.flush()
+        self.statistics.end_session()
+        for service in self.services.values():
+            service.clear_cache()
+
+    def close(self):
+        for service in self.services.values():
+            service.close()
+
+    def bind(self, conn):
+        self.conn = conn
         for service in self.services.values():
-            service.flush_cache()
\ No newline at end of file
+            service.bind(conn)
+
+
+class SessionFactory:
+    def __init__(self, pool, *classes, retain_cache=False, **session_kwargs):
+        self.pool = pool
+        self.classes = classes
+        self.retain_cache = retain_cache
+        self.session_kwargs = session_kwargs
+        self.local = threading.local()
+        self.schemas = {}
+        for clazz in classes:
+            clazz.get_mapper()
+        if session_kwargs.get("validate_schema"):
+            conn = pool.checkout()
+            try:
+                self.schemas = self.create_session(conn).schemas
+            finally:
+                pool.checkin(conn)
+
+    def create_session(self, conn=None):
+        session = PybernateSession(conn, **self.session_kwargs)
+        session.schemas = dict(self.schemas)
+        session.register_class(*self.classes)
+        return session
+
+    def get_session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = self.create_session()
+        return session
+
+    @contextmanager
+    def session(self):
+        session = self.get_session()
+        session.bind(self.pool.checkout())
+        try:
+            yield session
+            if self.retain_cache:
+                session.flush()
+            else:
+                session.end_session()
+        except Exception:
+            for service in session.services.values():
+                service.discard_cache()
+            raise
+        finally:
+            conn = session.conn
+            session.close()
+            session.bind(None)
+            self.pool.checkin(conn)
+
+    def remove(self):
+        self.local.session = None
+
+    def dispose(self):
+        self.pool.dispose()
@@ -0,0 +1,192 @@
+from Pybernate.Dialect import MySQLDialect
+
+
+def pad_values(values):
+    size = 1
+    while size < len(values):
+        size <<= 1
+    return list(values) + [values[-1]] * (size - len(values))
+
+
+def batch_counts(count, batch_size):
+    counts = [batch_size] * (count // batch_size)
+    remainder = count % batch_size
+    size = 1
+    while size <= remainder:
+        size <<= 1
+    while remainder:
+        size >>= 1
+        if remainder >= size:
+            counts.append(size)
+            remainder -= size
+    return counts
+
+
+class Statements:
+    def __init__(self, mapper, dialect=None):
+        self.mapper = mapper
+        self.dialect = dialect or MySQLDialect()
+        self.quote = self.dialect.quote
+        self.table = mapper.table
+        self.id_column = self.quote(mapper.id_column)
+        self.lazy_fields = tuple(mapper.get_fields(mapper.column_mask & ~mapper.lazy_mask)) + (mapper.id_column,)
+        self.statements = {}
+
+    def get(self, kind, *args):
+        key = (kind,) + args
+        statement = self.statements.get(key)
+        if statement is None:
+            statement = self.statements[key] = self.dialect.format(getattr(self, "_" + kind)(*args))
+        return statement
+
+    def insert(self, fields, count=1):
+        return self.get("insert", tuple(fields), count)
+
+    def update(self, fields):
+        return self.get("update", tuple(fields))
+
+    def delete(self, count=1):
+        return self.get("delete", count)
+
+    def delete_versioned(self):
+        return self.get("delete_versioned")
+
+    def select(self, fields, count=1):
+        return self.get("select", tuple(fields), count)
+
+    def select_lazy(self, count=1):
+        return self.get("select", self.lazy_fields, count)
+
+    def select_by(self, column, count=1):
+        return self.get("select_by", column, count)
+
+    def select_join(self, name, other, join_column, foreign_key, count=1):
+        return self.get("select_join", name, other, join_column, foreign_key, count)
+
+    def select_all(self):
+        return self.get("select_all")
+
+    def select_ids_by(self, column):
+        return self.get("select_ids_by", column)
+
+    def select_bounds(self):
+        return self.get("select_bounds")
+
+    def select_range(self, fields):
+        return self.get("select_range", tuple(fields))
+
+    def count_by(self, column, count=1):
+        return self.get("count_by", column, count)
+
+    def query(self, fields, filters, orders, keyset, limit):
+        return self.get("query", tuple(fields), filters, orders, keyset, limit)
+
+    def _insert(self, fields, count):
+        if not fields and self.dialect.default_values is not None:
+            if count != 1:
+                raise ValueError("{} can only insert one row of default values at a time".format(self.dialect.name))
+            return "INSERT INTO {} {}{}".format(self.table, self.dialect.default_values,
+                                                self.dialect.get_insert_suffix(self.mapper.id_column))
+        row = "({})".format(", ".join(["%s"] * len(fields)))
+        return "INSERT INTO {} ({}) VALUES {}{}".format(self.table,
+                                                        ", ".join([self.quote(field) for field in fields]),
+                                                        ", ".join([row] * count),
+                                                        self.dialect.get_insert_suffix(self.mapper.id_column))
+
+    def _update(self, fields):
+        updates = ["{} = %s".format(self.quote(field)) for field in fields]
+        where = self._where_id(1)
+        if self.mapper.version_column is not None:
+            version = self.quote(self.mapper.version_column)
+            updates.append("{0} = {0} + 1".format(version))
+            where += " AND {} = %s".format(version)
+        return "UPDATE {} SET {} WHERE {}".format(self.table, ", ".join(updates), where)
+
+    def _delete(self, count):
+        return "DELETE FROM {} WHERE {}".format(self.table, self._where_id(count))
+
+    def _delete_versioned(self):
+        return "DELETE FROM {} WHERE {} AND {} = %s".format(self.table, self._where_id(1),
+                                                            self.quote(self.mapper.version_column))
+
+    def _select(self, fields, count):
+        return "SELECT {} FROM {} WHERE {}".format(", ".join([self.quote(field) for field in fields]),
+                                                   self.table,
+                                                   self._where_id(count))
+
+    def get_select_by_fields(self, column):
+        return self.lazy_fields if column in self.lazy_fields else self.lazy_fields + (column,)
+
+    def _select_by(self, column, count):
+        fields = self.get_select_by_fields(column)
+        return "SELECT {} FROM {} WHERE {}".format(", ".join([self.quote(field) for field in fields]),
+                                                   self.table,
+                                                   self._where(self.quote(column), count))
+
+    def _select_join(self, name, other, join_column, foreign_key, count):
+        fields = ["t." + self.quote(field) for field in self.lazy_fields]
+        fields += ["o.{} AS {}".format(self.quote(field), self.quote(name + "." + field))
+                   for field in other.lazy_fields]
+        return "SELECT {} FROM {} t LEFT JOIN {} o ON o.{} = t.{} WHERE {}".format(", ".join(fields),
+                                                                                 self.table,
+                                                                                 other.table,
+                                                                                 self.quote(foreign_key),
+                                                                                 self.quote(join_column),
+                                                                                 self._where("t." + self.id_column, count))
+
+    def _select_all(self):
+        return "SELECT * FROM {} WHERE {}".format(self.table, self._where_id(1))
+
+    def _select_ids_by(self, column):
+        return "SELECT {} FROM {} WHERE {} = %s".format(self.id_column, self.table, self.quote(column))
+
+    def _select_bounds(self):
+        return "SELECT MIN({0}) AS {1}, MAX({0}) AS {2} FROM {3}".format(self.id_column, self.quote("low"),
+                                                                       self.quote("high"), self.table)
+
+    def _select_range(self, fields):
+        return "SELECT {0} FROM {1} WHERE {2} >= %s AND {2} < %s ORDER BY {2}".format(
+            ", ".join([self.quote(field) for field in fields]), self.table, self.id_column)
+
+    def _count_by(self, column, count):
+        return "SELECT {0}, COUNT(*) AS {1} FROM {2} WHERE {3} GROUP BY {0}".format(self.quote(column),
+                                                                                  self.quote("count"), self.table,
+                                                                                  self._where(self.quote(column),
+                                                                                              count))
+
+    def _query(self, fields, filters, orders, keyset, limit):
+        conditions = [self._condition(column, operator, count) for column, operator, count in filters]
+        if keyset:
+            conditions.append(self._keyset(orders))
+        query = "SELECT {} FROM {}".format(", ".join([self.quote(field) for field in fields]), self.table)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if orders:
+            query += " ORDER BY " + ", ".join([self.quote(column) + (" DESC" if descending else "")
+                                               for column, descending in orders])
+        if limit:
+            query += " LIMIT %s"
+        return query
+
+    def _condition(self, column, operator, count):
+        if operator == "in":
+            return self._where(self.quote(column), count) if count else "1 = 0"
+        if operator in ("is", "is not"):
+            return "{} {} NULL".format(self.quote(column), operator.upper())
+        return "{} {} %s".format(self.quote(column), operator.upper())
+
+    def _keyset(self, orders):
+        disjuncts = []
+        for position, (column, descending) in enumerate(orders):
+            terms = ["{} = %s".format(self.quote(previous)) for previous, previous_descending in orders[:position]]
+            terms.append("{} {} %s".format(self.quote(column), "<" if descending else ">"))
+            disjuncts.append("({})".format(" AND ".join(terms)))
+        return "({})".format(" OR ".join(disjuncts))
+
+    def _where_id(self, count):
+        return self._where(self.id_column, count)
+
+    def _where(self, column, count):
+        if count == 1:
+            return "{} = %s".format(column)
+        return "{} IN ({})".format(column, ", ".join(["%s"] * count))
@@ -0,0 +1,116 @@
+import logging
+from collections import Counter, deque
+
+logger = logging.getLogger("Pybernate")
+
+
+def get_statement_type(query):
+    return query.lstrip().split(None, 1)[0].upper()
+
+
+class Statistics:
+    def __init__(self, name, parent=None, slow_query_time=None, n_plus_one_threshold=None, samples=10000):
+        self.name = name
+        self.parent = parent
+        self.slow_query_time = slow_query_time
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.samples = samples
+        self.listeners = []
+        self.reset()
+
+    def reset(self):
+        self.statements = Counter()
+        self.rows_fetched = 0
+        self.rows_affected = 0
+        self.db_time = 0.0
+        self.times = deque(maxlen=self.samples)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.second_level_hits = 0
+        self.evictions = 0
+        self.hydrated = 0
+        self.slow_queries = []
+        self.query_counts = Counter()
+        self.n_plus_one = set()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def record_statement(self, name, query, values, elapsed, rowcount):
+        statement_type = get_statement_type(query)
+        self.statements[statement_type] += 1
+        if 0 <= rowcount < 1 << 63:
+            if statement_type == "SELECT":
+                self.rows_fetched += rowcount
+            else:
+                self.rows_affected += rowcount
+        self.db_time += elapsed
+        self.times.append(elapsed)
+        if self.slow_query_time is not None and elapsed >= self.slow_query_time:
+            self.slow_queries.append((name, query, elapsed))
+            logger.warning("Slow query on %s (%.3fs): %s", name, elapsed, query)
+        if self.n_plus_one_threshold is not None and statement_type == "SELECT":
+            self.query_counts[query] += 1
+            if self.query_counts[query] == self.n_plus_one_threshold:
+                self.n_plus_one.add(query)
+                logger.warning("Possible N+1 on %s, executed %d times: %s", name, self.n_plus_one_threshold, query)
+        for listener in self.listeners:
+            listener(name, query, values, elapsed, rowcount)
+        if self.parent is not None:
+            self.parent.record_statement(name, query, values, elapsed, rowcount)
+
+    def record_hit(self, second_level=False):
+        self.cache_hits += 1
+        if second_level:
+            self.second_level_hits += 1
+        if self.parent is not None:
+            self.parent.record_hit(second_level)
+
+    def record_miss(self, count=1):
+        self.cache_misses += count
+        if self.parent is not None:
+            self.parent.record_miss(count)
+
+    def record_eviction(self):
+        self.evictions += 1
+        if self.parent is not None:
+            self.parent.record_eviction()
+
+    def record_hydration(self, count=1):
+        self.hydrated += count
+        if self.parent is not None:
+            self.parent.record_hydration(count)
+
+    def end_session(self):
+        self.query_counts.clear()
+
+    def get_hit_rate(self):
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else 0.0
+
+    def get_percentile(self, percentile):
+        if not self.times:
+            return 0.0
+        times = sorted(self.times)
+        return times[min(len(times) - 1, int(len(times) * percentile / 100))]
+
+    def summary(self):
+        return {"name": self.name,
+                "statements": dict(self.statements),
+                "rows_fetched": self.rows_fetched,
+                "rows_affected": self.rows_affected,
+                "db_time": self.db_time,
+                "p50": self.get_percentile(50),
+                "p95": self.get_percentile(95),
+                "p99": self.get_percentile(99),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "second_level_hits": self.second_level_hits,
+                "hit_rate": self.get_hit_rate(),
+                "evictions": self.evictions,
+                "hydrated": self.hydrated,
+                "slow_queries": len(self.slow_queries),
+                "n_plus_one": sorted(self.n_plus_one)}
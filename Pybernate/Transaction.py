@@ -0,0 +1,48 @@
+from Pybernate.EntityService import flush_caches
+
+
+class Transaction:
+    def __init__(self, session, depth):
+        self.session = session
+        self.savepoint = "pybernate_savepoint_{}".format(depth) if depth else None
+        self.snapshots = []
+
+    def execute(self, statement):
+        with self.session.conn.cursor() as cursor:
+            cursor.execute(statement)
+
+    def begin(self):
+        if self.savepoint is not None:
+            self.execute("SAVEPOINT " + self.savepoint)
+        self.snapshots = [(service.cache, service.cache.snapshot()) for service in self.session.services.values()]
+
+    def commit(self):
+        if self.savepoint is not None:
+            self.execute("RELEASE SAVEPOINT " + self.savepoint)
+            return
+        try:
+            flush_caches(self.session.conn, [service.cache for service in self.session.services.values()])
+        except Exception:
+            self.restore()
+            raise
+        finally:
+            self.end()
+
+    def rollback(self):
+        if self.savepoint is not None:
+            self.execute("ROLLBACK TO SAVEPOINT " + self.savepoint)
+            self.restore()
+            return
+        try:
+            self.session.conn.rollback()
+            self.restore()
+        finally:
+            self.end()
+
+    def restore(self):
+        for cache, snapshot in self.snapshots:
+            cache.restore(snapshot)
+
+    def end(self):
+        for service in self.session.services.values():
+            service.cache.inserted = None
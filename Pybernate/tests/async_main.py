@@ -0,0 +1,174 @@
+import unittest
+from Pybernate.Entity import IdEntity
+from Pybernate.Annotations import lazy, oneToMany, manyToOne
+from Pybernate.AsyncSession import AsyncPybernateSession
+from Pybernate.Exceptions import LazyInitializationException, NoSuchEntityException
+from Pybernate.tests.memory_driver import MemoryPool
+
+
+class Qux(IdEntity):
+    def get_a(self):
+        return
+
+    def set_a(self, val):
+        return
+
+    @lazy
+    def get_b(self):
+        return
+
+    def set_b(self, val):
+        return
+
+
+class Vez(IdEntity):
+    def get_a(self):
+        return
+
+    @oneToMany(join_column="id", join_table="wez", foreign_key="foreign_id")
+    def get_wez(self):
+        return
+
+    @oneToMany(join_column="id", join_table="yez", foreign_key="foreign_id", mapped_by="color", fetch="batch")
+    def get_yez(self):
+        return
+
+
+class Wez(IdEntity):
+    @manyToOne(join_column="foreign_id", join_table="vez", foreign_key="id")
+    def get_vez(self):
+        return
+
+    def get_foreign_id(self):
+        return
+
+
+class Yez(IdEntity):
+    def get_foreign_id(self):
+        return
+
+    def get_color(self):
+        return
+
+
+class Jez(IdEntity):
+    @manyToOne(join_column="lez_id", join_table="lez", foreign_key="id")
+    def get_lez(self):
+        return
+
+    def get_lez_id(self):
+        return
+
+
+class Lez(IdEntity):
+    @manyToOne(join_column="mez_id", join_table="mez", foreign_key="id", fetch="batch")
+    def get_mez(self):
+        return
+
+    def get_mez_id(self):
+        return
+
+
+class Mez(IdEntity):
+    @manyToOne(join_column="jez_id", join_table="jez", foreign_key="id")
+    def get_jez(self):
+        return
+
+    def get_jez_id(self):
+        return
+
+
+class AsyncTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.pool = MemoryPool(latency=0.01)
+        self.pool.execute("CREATE TABLE qux (id INTEGER PRIMARY KEY AUTOINCREMENT, a VARCHAR(10), b VARCHAR(10))")
+        self.pool.execute("CREATE TABLE vez (id INTEGER PRIMARY KEY AUTOINCREMENT, a VARCHAR(10))")
+        self.pool.execute("CREATE TABLE wez (id INTEGER PRIMARY KEY AUTOINCREMENT, foreign_id INT)")
+        self.pool.execute("CREATE TABLE yez (id INTEGER PRIMARY KEY AUTOINCREMENT, foreign_id INT, color VARCHAR(10))")
+        for table_name, column in (("jez", "lez_id"), ("lez", "mez_id"), ("mez", "jez_id")):
+            self.pool.execute("CREATE TABLE {} (id INTEGER PRIMARY KEY AUTOINCREMENT, {} INT)".format(table_name, column))
+            for i in (1, 2):
+                self.pool.execute("INSERT INTO {} ({}) VALUES ({})".format(table_name, column, i))
+        self.session = AsyncPybernateSession(self.pool)
+        self.session.register_class(Qux, Vez, Wez, Yez, Jez, Lez, Mez)
+        self.qux_service = self.session.get_service("qux")
+        self.vez_service = self.session.get_service("vez")
+
+    def tearDown(self):
+        self.pool.close()
+
+    async def test_save_and_load(self):
+        qux = Qux(a="x", b="y")
+        await self.qux_service.save(qux)
+        await self.session.end_session()
+        loaded = await self.qux_service.by_id(qux.get_id())
+        self.assertEqual(loaded.get_a(), "x")
+        with self.assertRaises(LazyInitializationException):
+            loaded.get_b()
+        await self.qux_service.initialize(loaded, "b")
+        self.assertEqual(loaded.get_b(), "y")
+        await self.qux_service.save(Qux(id=42, a="z"))
+        await self.session.end_session()
+        self.assertEqual((await self.qux_service.by_id(42)).get_a(), "z")
+
+    async def test_flush_and_delete(self):
+        quxes = [Qux(a=str(i)) for i in range(4)]
+        await self.qux_service.save(quxes)
+        quxes[0].set_a("changed")
+        await self.qux_service.delete(quxes[1])
+        await self.session.end_session()
+        self.assertEqual((await self.qux_service.by_id(quxes[0].get_id())).get_a(), "changed")
+        with self.assertRaises(NoSuchEntityException):
+            await self.qux_service.by_id(quxes[1].get_id())
+        loaded = await self.qux_service.by_ids([quxes[2].get_id(), quxes[3].get_id()])
+        self.assertEqual([qux.get_a() for qux in loaded], ["2", "3"])
+        self.assertEqual(self.pool.active, 0)
+
+    async def test_relationships(self):
+        for i in range(3):
+            self.pool.execute("INSERT INTO vez (a) VALUES ('{}')".format(i))
+            self.pool.execute("INSERT INTO wez (foreign_id) VALUES ({})".format(i + 1))
+            self.pool.execute("INSERT INTO yez (foreign_id, color) VALUES ({}, 'red')".format(i + 1))
+            self.pool.execute("INSERT INTO yez (foreign_id, color) VALUES ({}, 'blue')".format(i + 1))
+        vezes = await self.vez_service.by_ids([1, 2, 3])
+        for vez in vezes:
+            self.assertEqual(len(vez.get_wez()), 1)
+            self.assertIs(vez.get_wez()[0].get_vez(), vez)
+            self.assertEqual(vez.get_yez()["red"].get_foreign_id(), vez.get_id())
+        self.assertGreater(self.pool.max_active, 1)
+        self.assertEqual(self.pool.active, 0)
+
+    async def test_graph_loading(self):
+        jezzes = await self.session.get_service("jez").by_ids([1, 2])
+        self.assertEqual([jez.get_lez().get_mez().get_jez() for jez in jezzes], jezzes)
+        session = AsyncPybernateSession(self.pool, max_depth=1)
+        session.register_class(Jez, Lez, Mez)
+        lezzes = [jez.get_lez() for jez in await session.get_service("jez").by_ids([1, 2])]
+        self.assertFalse(any(lez.is_loaded("mez") for lez in lezzes))
+        with self.assertRaises(LazyInitializationException):
+            lezzes[0].get_mez()
+        await session.get_service("lez").load_relationship(lezzes, "mez")
+        self.assertEqual([lez.get_mez().get_id() for lez in lezzes], [1, 2])
+        session = AsyncPybernateSession(self.pool)
+        session.register_class(Jez, Lez, Mez)
+        jez = await session.get_service("jez").by_id(1, fetch=["lez.mez"])
+        self.assertFalse(jez.get_lez().get_mez().is_loaded("jez"))
+
+    async def test_read_own_writes(self):
+        vez = Vez(a="x")
+        await self.vez_service.save(vez)
+        await self.session.get_service("wez").save([Wez(foreign_id=vez.get_id()) for i in range(2)])
+        other = AsyncPybernateSession(self.pool)
+        other.register_class(Vez, Wez, Yez)
+        with self.assertRaises(NoSuchEntityException):
+            await other.get_service("vez").by_id(vez.get_id())
+        loaded = await self.vez_service.by_id(vez.get_id())
+        self.assertEqual(len(loaded.get_wez()), 2)
+        await self.session.end_session()
+        self.assertEqual(len((await other.get_service("vez").by_id(vez.get_id())).get_wez()), 2)
+        self.assertEqual(self.pool.active, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
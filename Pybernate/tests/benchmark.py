@@ -0,0 +1,217 @@
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from Pybernate.Entity import IdEntity
+from Pybernate.Annotations import oneToMany, manyToOne
+from Pybernate.Session import PybernateSession
+from Pybernate.tests.sqlite_driver import connect
+
+
+class Foo(IdEntity):
+    def get_a(self):
+        return
+
+    def set_a(self, val):
+        return
+
+    def get_b(self):
+        return
+
+    def set_b(self, val):
+        return
+
+
+class Fez(IdEntity):
+    def get_a(self):
+        return
+
+    @oneToMany(join_column="id", join_table="bez", foreign_key="foreign_id", fetch="batch")
+    def get_bez(self):
+        return
+
+    @oneToMany(join_column="id", join_table="pez", foreign_key="foreign_id", mapped_by="color", fetch="batch")
+    def get_pez(self):
+        return
+
+
+class Bez(IdEntity):
+    @manyToOne(join_column="foreign_id", join_table="fez", foreign_key="id", fetch="batch")
+    def get_fez(self):
+        return
+
+    def get_foreign_id(self):
+        return
+
+
+class Pez(IdEntity):
+    def get_foreign_id(self):
+        return
+
+    def get_color(self):
+        return
+
+
+class Benchmark:
+    def __init__(self, scale=1000, latency=0, maxsize=20):
+        self.scale = scale
+        self.latency = latency
+        self.maxsize = maxsize
+        self.random = random.Random(0)
+        self.connection = connect(latency=latency)
+        with self.connection.cursor() as cursor:
+            cursor.execute("CREATE TABLE foo (a INT, b VARCHAR(10), id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE fez (a INT, id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE bez (foreign_id INT, id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE pez (foreign_id INT, color VARCHAR(10), id INT AUTO_INCREMENT KEY)")
+        self.connection.commit()
+        session = self.create_session(maxsize=float("inf"))
+        self.foo_ids = [foo.get_id() for foo in self.save(session, "foo", [Foo(a=i, b=str(i)) for i in range(scale)])]
+        fezzes = self.save(session, "fez", [Fez(a=i) for i in range(scale // 10)])
+        self.fez_ids = [fez.get_id() for fez in fezzes]
+        self.save(session, "bez", [Bez(foreign_id=fez.get_id()) for fez in fezzes for i in range(5)])
+        self.save(session, "pez", [Pez(foreign_id=fez.get_id(), color=color) for fez in fezzes
+                                   for color in ["red", "green", "blue"]])
+        session.end_session()
+
+    def create_session(self, **kwargs):
+        session = PybernateSession(self.connection, **dict({"maxsize": self.maxsize}, **kwargs))
+        session.register_class(Foo, Fez, Bez, Pez)
+        return session
+
+    def save(self, session, name, entities):
+        session.get_service(name).save(entities)
+        return entities
+
+    def bench_construction(self):
+        for i in range(self.scale):
+            Foo(a=i, b=str(i))
+        return self.scale
+
+    def bench_by_id_cold(self):
+        for id in self.foo_ids:
+            self.create_session().get_service("foo").by_id(id)
+        return len(self.foo_ids)
+
+    def bench_by_id_hot(self):
+        service = self.create_session(maxsize=len(self.foo_ids)).get_service("foo")
+        service.by_ids(self.foo_ids)
+        for id in self.foo_ids:
+            service.by_id(id)
+        return len(self.foo_ids)
+
+    def bench_by_ids(self):
+        self.create_session(maxsize=len(self.foo_ids)).get_service("foo").by_ids(self.foo_ids)
+        return len(self.foo_ids)
+
+    def bench_hydration(self):
+        service = self.create_session().get_service("foo")
+        for i in range(10):
+            service.query().all()
+        return self.scale * 10
+
+    def bench_graph_load(self):
+        session = self.create_session(maxsize=self.scale * 10)
+        for fez in session.get_service("fez").by_ids(self.fez_ids):
+            fez.get_bez()[0].get_fez()
+            fez.get_pez()["red"]
+        return len(self.fez_ids)
+
+    def bench_bulk_save(self):
+        session = self.create_session(maxsize=self.scale)
+        self.save(session, "foo", [Foo(a=i, b=str(i)) for i in range(self.scale)])
+        session.end_session()
+        return self.scale
+
+    def bench_flush(self):
+        session = self.create_session(maxsize=self.scale * 2)
+        service = session.get_service("foo")
+        foos = self.save(session, "foo", [Foo(a=i, b=str(i)) for i in range(self.scale)])
+        session.flush()
+        for foo in foos[:self.scale // 2]:
+            foo.set_b("updated")
+        service.delete(foos[self.scale // 2:])
+        session.end_session()
+        return self.scale
+
+    def bench_eviction_churn(self):
+        service = self.create_session().get_service("foo")
+        for i in range(self.scale):
+            foo = service.by_id(self.random.choice(self.foo_ids))
+            if i % 3 == 0:
+                foo.set_b(str(i))
+        service.session.end_session()
+        return self.scale
+
+    def run(self, name):
+        method = getattr(self, "bench_" + name)
+        queries = self.connection.queries
+        tracemalloc.start()
+        start = time.perf_counter()
+        operations = method()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {"operations": operations,
+                "seconds": elapsed,
+                "ops_per_second": operations / elapsed if elapsed else 0.0,
+                "queries": self.connection.queries - queries,
+                "peak_kb": peak / 1024}
+
+
+BENCHMARKS = ("construction", "by_id_cold", "by_id_hot", "by_ids", "hydration", "graph_load", "bulk_save", "flush",
+              "eviction_churn")
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result["ops_per_second"] < previous["ops_per_second"] * (1 - threshold):
+            regressions.append("{}: {:.0f} ops/s, baseline {:.0f}".format(name, result["ops_per_second"],
+                                                                         previous["ops_per_second"]))
+        if result["queries"] > previous["queries"]:
+            regressions.append("{}: {} queries, baseline {}".format(name, result["queries"], previous["queries"]))
+        if result["peak_kb"] > previous["peak_kb"] * (1 + threshold):
+            regressions.append("{}: {:.0f} KiB peak, baseline {:.0f}".format(name, result["peak_kb"],
+                                                                            previous["peak_kb"]))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run the Pybernate benchmarks against an in-memory database")
+    parser.add_argument("names", nargs="*", default=BENCHMARKS, help="benchmarks to run")
+    parser.add_argument("--scale", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0, help="seconds added to every statement")
+    parser.add_argument("--save", help="write the results to this baseline file")
+    parser.add_argument("--compare", help="compare the results with this baseline file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown")
+    options = parser.parse_args(args)
+    results = {}
+    print("{:<16}{:>12}{:>12}{:>10}{:>12}".format("benchmark", "ops/s", "seconds", "queries", "peak KiB"))
+    for name in options.names:
+        result = results[name] = Benchmark(options.scale, options.latency).run(name)
+        print("{:<16}{:>12.0f}{:>12.4f}{:>10}{:>12.0f}".format(name, result["ops_per_second"], result["seconds"],
+                                                              result["queries"], result["peak_kb"]))
+    if options.save:
+        with open(options.save, "w") as baseline_file:
+            json.dump({"scale": options.scale, "latency": options.latency, "results": results}, baseline_file,
+                      indent=2, sort_keys=True)
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["scale"] != options.scale or baseline["latency"] != options.latency:
+            print("Baseline was recorded with scale {} and latency {}".format(baseline["scale"], baseline["latency"]))
+            return 2
+        regressions = compare(results, baseline["results"], options.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
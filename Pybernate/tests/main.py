@@ -1,9 +1,15 @@
+import json
+import threading
+import time
 import unittest
 import pymysql.cursors
 from Pybernate.Entity import IdEntity
-from Pybernate.Annotations import lazy, transient, id, oneToMany, manyToOne
-from Pybernate.Exceptions import LazyInitializationException, NoMatchingSchemaException, NoSuchEntityException, InvalidEntityServiceException
-from Pybernate.Session import PybernateSession
+from Pybernate.Annotations import lazy, transient, id, version, table, convert, oneToMany, manyToOne, cacheable
+from Pybernate.Exceptions import LazyInitializationException, NoMatchingSchemaException, NoSuchEntityException, InvalidEntityServiceException, PoolTimeoutException, StaleObjectException, SchemaMismatchException
+from Pybernate.Pool import ConnectionPool
+from Pybernate.Session import PybernateSession, SessionFactory
+from Pybernate.SecondLevelCache import SecondLevelCache
+from Pybernate.IdGenerator import HiLoGenerator
 
 
 class Foo(IdEntity):
@@ -89,29 +95,167 @@ class Pez(IdEntity):
     def get_color(self):
         return
 
+class Kez(IdEntity):
+    def get_a(self):
+        return
+
+    @oneToMany(join_column="id", join_table="lez", foreign_key="foreign_id", fetch="batch")
+    def get_lez(self):
+        return
+
+    @oneToMany(join_column="id", join_table="mez", foreign_key="foreign_id", mapped_by="color", fetch="join")
+    def get_mez(self):
+        return
+
+
+class Lez(IdEntity):
+    @manyToOne(join_column="foreign_id", join_table="kez", foreign_key="id", fetch="batch")
+    def get_kez(self):
+        return
+
+    def get_foreign_id(self):
+        return
+
+
+class Mez(IdEntity):
+    def get_foreign_id(self):
+        return
+
+    def get_color(self):
+        return
+
+
+@cacheable(maxsize=100, ttl=60)
+class Jez(IdEntity):
+    def get_a(self):
+        return
+
+    def set_a(self, val):
+        return
+
+
+class Nez(IdEntity):
+    def get_a(self):
+        return
+
+    def set_a(self, val):
+        return
+
+    @version
+    def get_version(self):
+        return
+
+
+class Rez(IdEntity):
+    @convert(load=json.loads, dump=json.dumps)
+    def get_data(self):
+        return
+
+    def set_data(self, val):
+        return
+
+
+class Gez(IdEntity):
+    @manyToOne(join_column="hez_id", join_table="hez", foreign_key="id", fetch="batch")
+    def get_hez(self):
+        return
+
+    def get_hez_id(self):
+        return
+
+
+class Hez(IdEntity):
+    @manyToOne(join_column="iez_id", join_table="iez", foreign_key="id", fetch="batch")
+    def get_iez(self):
+        return
+
+    def get_iez_id(self):
+        return
+
+
+class Iez(IdEntity):
+    @manyToOne(join_column="gez_id", join_table="gez", foreign_key="id")
+    def get_gez(self):
+        return
+
+    def get_gez_id(self):
+        return
+
+
+class Dez(IdEntity):
+    def get_a(self):
+        return
+
+    @oneToMany(join_column="id", join_table="eez", foreign_key="foreign_id", fetch="lazy")
+    def get_eez(self):
+        return
+
+    @oneToMany(join_column="id", join_table="eez", foreign_key="foreign_id", mapped_by="color", fetch="lazy")
+    def get_colors(self):
+        return
+
+
+class Eez(IdEntity):
+    @manyToOne(join_column="foreign_id", join_table="dez", foreign_key="id", fetch="batch")
+    def get_dez(self):
+        return
+
+    def get_foreign_id(self):
+        return
+
+    def get_color(self):
+        return
+
+
+class Oez(IdEntity):
+    @table(name="foo")
+    def get_a(self):
+        return
+
+    def get_c(self):
+        return
+
 class Test(unittest.TestCase):
 
+    def connect(self):
+        return pymysql.connect(host='',
+                               user='local',
+                               password='',
+                               db='Pybernate',
+                               charset='utf8mb4',
+                               cursorclass=pymysql.cursors.DictCursor)
+
     def setUp(self):
-        self.connection = pymysql.connect(host='',
-                                     user='local',
-                                     password='',
-                                     db='Pybernate',
-                                     charset='utf8mb4',
-                                     cursorclass=pymysql.cursors.DictCursor)
+        self.connection = self.connect()
         self.session = PybernateSession(self.connection)
-        self.session.register_class(Foo, Bar, Baz, Fez, Bez, Pez)
+        self.session.register_class(Foo, Bar, Baz, Fez, Bez, Pez, Kez, Lez, Mez)
         self.foo_service = self.session.get_service("foo")
         self.bar_service = self.session.get_service("bar")
         self.baz_service = self.session.get_service("baz")
         self.fez_service = self.session.get_service("fez")
         self.bez_service = self.session.get_service("bez")
         self.pez_service = self.session.get_service("pez")
+        self.kez_service = self.session.get_service("kez")
+        self.lez_service = self.session.get_service("lez")
+        self.mez_service = self.session.get_service("mez")
         with self.connection.cursor() as cursor:
             cursor.execute("CREATE TABLE IF NOT EXISTS foo (a int, b VARCHAR(10), id INT AUTO_INCREMENT KEY)")
             cursor.execute("CREATE TABLE IF NOT EXISTS bar (c INT, d VARCHAR(10), not_id INT AUTO_INCREMENT KEY)")
             cursor.execute("CREATE TABLE IF NOT EXISTS fez (a INT, id INT AUTO_INCREMENT KEY)")
             cursor.execute("CREATE TABLE IF NOT EXISTS bez (foreign_id INT, id INT AUTO_INCREMENT KEY)")
             cursor.execute("CREATE TABLE IF NOT EXISTS pez (foreign_id INT, color VARCHAR(10), id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS kez (a INT, id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS lez (foreign_id INT, id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS mez (foreign_id INT, color VARCHAR(10), id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS jez (a INT, id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS nez (a INT, version INT, id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS rez (data VARCHAR(100), id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS gez (hez_id INT, id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS dez (a INT, id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS eez (foreign_id INT, color VARCHAR(10), id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS hez (iez_id INT, id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS iez (gez_id INT, id INT AUTO_INCREMENT KEY)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS pybernate_hilo (name VARCHAR(64) PRIMARY KEY, next_hi INT)")
         self.connection.commit()
 
     def tearDown(self):
@@ -121,6 +265,18 @@ class Test(unittest.TestCase):
             cursor.execute("DROP TABLE fez")
             cursor.execute("DROP TABLE bez")
             cursor.execute("DROP TABLE pez")
+            cursor.execute("DROP TABLE kez")
+            cursor.execute("DROP TABLE lez")
+            cursor.execute("DROP TABLE mez")
+            cursor.execute("DROP TABLE jez")
+            cursor.execute("DROP TABLE nez")
+            cursor.execute("DROP TABLE rez")
+            cursor.execute("DROP TABLE gez")
+            cursor.execute("DROP TABLE dez")
+            cursor.execute("DROP TABLE eez")
+            cursor.execute("DROP TABLE hez")
+            cursor.execute("DROP TABLE iez")
+            cursor.execute("DROP TABLE pybernate_hilo")
         self.connection.commit()
 
     def test_save_load(self):
@@ -133,6 +289,12 @@ class Test(unittest.TestCase):
         assert foo_three.get_a() == 2
         assert foo_three.get_b() == "four"
 
+        explicit = Foo(id=4242, a=3, b="six")
+        self.foo_service.save(explicit)
+        assert explicit.get_id() == 4242 and not explicit._is_new()
+        self.session.end_session()
+        assert self.foo_service.by_id(4242).get_b() == "six"
+
     def test_set(self):
         foo = Foo(a=1, b="two")
         foo.set_b("three")
@@ -144,6 +306,315 @@ class Test(unittest.TestCase):
         foo_three = self.foo_service.by_id(foo.id)
         assert foo.get_b() == foo_three.get_b() == "four"
 
+    def test_by_ids(self):
+        foos = [Foo(a=i, b=str(i)) for i in range(30)]
+        self.foo_service.save(foos)
+        self.foo_service.flush_cache()
+        ids = [foo.get_id() for foo in reversed(foos)]
+        loaded_foos = self.foo_service.by_ids(ids)
+        assert [foo.get_id() for foo in loaded_foos] == ids
+        assert [foo.get_a() for foo in loaded_foos] == list(reversed(range(30)))
+        try:
+            self.foo_service.by_ids([ids[0], max(ids) + 1])
+            assert False
+        except NoSuchEntityException:
+            pass
+
+    def test_bulk_insert(self):
+        foos = [Foo(a=i, b=str(i)) for i in range(37)] + [Foo(a=i) for i in range(3)]
+        self.foo_service.save(foos)
+        ids = [foo.get_id() for foo in foos]
+        assert ids[:37] == list(range(ids[0], ids[0] + 37))
+        assert len(set(ids)) == 40
+        self.session.end_session()
+        assert [foo.get_b() for foo in self.foo_service.by_ids(ids)] == [str(i) for i in range(37)] + [None] * 3
+
+    def test_hilo_generator(self):
+        pool = ConnectionPool(self.connect, size=1)
+        session = PybernateSession(self.connection, batch_size=8, id_generator=HiLoGenerator(pool, max_lo=10))
+        session.register_class(Foo)
+        foos = [Foo(a=i, b=str(i)) for i in range(25)]
+        session.get_service("foo").save(foos)
+        session.end_session()
+        assert [foo.get_id() for foo in foos] == list(range(1, 26))
+        session.get_service("foo").save(Foo(a=25))
+        assert [foo.get_a() for foo in session.get_service("foo").by_ids(range(1, 27))] == list(range(26))
+        session.end_session()
+        pool.dispose()
+
+    def test_optimistic_locking(self):
+        other_connection = self.connect()
+        sessions = [PybernateSession(connection) for connection in (self.connection, other_connection)]
+        for session in sessions:
+            session.register_class(Nez)
+        services = [session.get_service("nez") for session in sessions]
+        nezzes = [Nez(a=i) for i in range(3)]
+        services[0].save(nezzes)
+        sessions[0].flush()
+        assert [nez.get_version() for nez in nezzes] == [0, 0, 0]
+        others = services[1].by_ids([nez.get_id() for nez in nezzes])
+        others[0].set_a(10)
+        services[1].delete(others[2])
+        sessions[1].flush()
+        assert others[0].get_version() == 1
+        nezzes[0].set_a(20)
+        nezzes[1].set_a(21)
+        with self.assertRaises(StaleObjectException):
+            sessions[0].flush()
+        assert services[0].refresh(nezzes[:2]) == [nezzes[0]]
+        assert nezzes[0].get_a() == 10 and nezzes[0].get_version() == 1
+        assert nezzes[1].get_a() == 21
+        nezzes[0].set_a(20)
+        sessions[0].flush()
+        assert [nez.get_version() for nez in nezzes[:2]] == [2, 1]
+        with self.assertRaises(NoSuchEntityException):
+            services[0].refresh(nezzes[2])
+        sessions[1].end_session()
+        assert [nez.get_a() for nez in services[1].by_ids([nez.get_id() for nez in nezzes[:2]])] == [20, 21]
+        other_connection.close()
+
+    def count_rows(self, table):
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) AS count FROM " + table)
+            return cursor.fetchone()["count"]
+
+    def test_transaction(self):
+        foos = [Foo(a=i, b=str(i)) for i in range(3)]
+        with self.session.transaction():
+            self.foo_service.save(foos)
+            foos[0].set_a(10)
+            new_foo = Foo(a=3)
+            with self.assertRaises(ValueError):
+                with self.session.transaction():
+                    foos[1].set_a(11)
+                    self.foo_service.delete(foos[2])
+                    self.foo_service.save(new_foo)
+                    raise ValueError
+            assert foos[1].get_a() == 1 and not foos[1].get_dirty()
+            assert not foos[2].get_deleted() and new_foo.get_id() is None
+            with self.session.transaction():
+                foos[1].set_a(21)
+        self.session.end_session()
+        assert [foo.get_a() for foo in self.foo_service.by_ids([foo.get_id() for foo in foos])] == [10, 21, 2]
+        assert self.count_rows("foo") == 3
+        with self.assertRaises(ValueError):
+            with self.session.transaction():
+                foo = self.foo_service.by_id(foos[0].get_id())
+                foo.set_a(30)
+                self.foo_service.save(new_foo)
+                self.session.flush()
+                raise ValueError
+        assert foo.get_a() == 10 and not foo.get_dirty() and new_foo.get_id() is None
+        with self.assertRaises(ValueError):
+            with self.session.transaction():
+                self.foo_service.by_id(foos[0].get_id()).set_a(99)
+                self.foo_service.flush_cache()
+                raise ValueError
+        self.session.end_session()
+        assert self.foo_service.by_id(foos[0].get_id()).get_a() == 10
+        assert self.count_rows("foo") == 3
+
+    def test_converters(self):
+        self.session.register_class(Rez)
+        rez_service = self.session.get_service("rez")
+        rezzes = [Rez(data={"a": i}) for i in range(4)]
+        rez_service.save(rezzes)
+        rezzes[0].set_data({"a": [0]})
+        rezzes[3].set_data(None)
+        self.session.end_session()
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT data FROM rez WHERE id = %s", [rezzes[0].get_id()])
+            assert cursor.fetchone()["data"] == '{"a": [0]}'
+        loaded = rez_service.by_ids([rez.get_id() for rez in rezzes])
+        assert [rez.get_data() for rez in loaded] == [{"a": [0]}, {"a": 1}, {"a": 2}, None]
+        assert [row.data for row in rez_service.project("data").order_by("id")] == [{"a": [0]}, {"a": 1}, {"a": 2}, None]
+
+    def test_graph_loading(self):
+        with self.connection.cursor() as cursor:
+            for table_name, column in (("gez", "hez_id"), ("hez", "iez_id"), ("iez", "gez_id")):
+                cursor.executemany("INSERT INTO {} ({}) VALUES (%s)".format(table_name, column), [[1], [2]])
+        self.connection.commit()
+
+        def load(**kwargs):
+            session = PybernateSession(self.connection)
+            session.register_class(Gez, Hez, Iez)
+            return session.get_service("gez").by_ids([1, 2], **kwargs)
+
+        gezzes = load()
+        assert [gez.get_hez().get_iez().get_gez() for gez in gezzes] == gezzes
+        gezzes = load(max_depth=1)
+        hezzes = [gez.get_hez() for gez in gezzes]
+        assert not any(hez.is_loaded("iez") for hez in hezzes)
+        assert [hez.get_iez().get_gez() for hez in hezzes] == gezzes
+        assert all(hez.is_loaded("iez") for hez in hezzes)
+        gezzes = load(max_depth=0)
+        assert not gezzes[1].is_loaded("hez") and gezzes[1].get_hez().get_id() == 2
+        gezzes = load(fetch=["hez.iez"])
+        iez = gezzes[0].get_hez().get_iez()
+        assert not iez.is_loaded("gez") and iez.get_gez() is gezzes[0]
+
+    def test_lazy_collections(self):
+        session = PybernateSession(self.connection, maxsize=100)
+        session.register_class(Dez, Eez)
+        dez_service = session.get_service("dez")
+        dezzes = [Dez(a=i) for i in range(4)]
+        dez_service.save(dezzes)
+        session.get_service("eez").save([Eez(foreign_id=dez.get_id(), color=str(i))
+                                         for dez in dezzes for i in range(dez.get_a())])
+        session.end_session()
+        queries = []
+        session.statistics.add_listener(lambda name, query, values, elapsed, rowcount: queries.append(query))
+        dezzes = dez_service.by_ids([dez.get_id() for dez in dezzes])
+        assert len(queries) == 1
+        assert [len(dez.get_eez()) for dez in dezzes] == [0, 1, 2, 3]
+        assert len(queries) == 2 and not dezzes[3].get_eez().loaded
+        assert [[eez.get_color() for eez in dez.get_eez()] for dez in dezzes] == [[], ["0"], ["0", "1"], ["0", "1", "2"]]
+        assert len(queries) == 3
+        assert dezzes[2].get_eez()[1].get_dez() is dezzes[2]
+        assert isinstance(dezzes[3].get_colors(), dict)
+        assert sorted(dezzes[3].get_colors()) == ["0", "1", "2"] and "1" in dezzes[2].get_colors()
+        assert len(queries) == 4
+
+    def test_schema_validation(self):
+        session = PybernateSession(self.connection, validate_schema=True)
+        session.register_class(Foo, Nez)
+        assert session.get_service("foo").schema.columns == ["a", "b", "id"]
+        with self.assertRaises(SchemaMismatchException) as context:
+            session.register_class(Oez)
+        assert context.exception.problems == ["column c does not exist"]
+        with self.assertRaises(SchemaMismatchException):
+            PybernateSession(self.connection, validate_schema=True).register_class(Zoo)
+        pool = ConnectionPool(self.connect, size=1)
+        factory = SessionFactory(pool, Foo, validate_schema=True)
+        with factory.session() as session:
+            assert session.get_service("foo").schema is factory.schemas["foo"]
+        factory.dispose()
+
+    def test_cache_policies(self):
+        session = PybernateSession(self.connection, maxsize=2, policy="lru")
+        session.register_class(Foo)
+        session.register_class(Bar, policy="unbounded")
+        foo_service = session.get_service("foo")
+        foos = [Foo(a=i, b=str(i)) for i in range(5)]
+        foo_service.save(foos)
+        session.flush()
+        for foo in foos:
+            foo.set_b("updated")
+            foo_service.save(foo)
+        assert len(foo_service.cache) == 2 and len(foo_service.cache.pending) == 3
+        assert foo_service.by_id(foos[0].get_id()) is foos[0]
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT b FROM foo WHERE id = %s", [foos[0].get_id()])
+            assert cursor.fetchone()["b"] == "0"
+        session.end_session()
+        assert [foo.get_b() for foo in foo_service.by_ids([foo.get_id() for foo in foos])] == ["updated"] * 5
+        bar_service = session.get_service("bar")
+        bar_service.save([Bar(c=i) for i in range(30)])
+        assert len(bar_service.cache) == 30
+
+        sized_session = PybernateSession(self.connection, maxsize=100, maxbytes=foos[0]._estimated_size() * 3)
+        sized_session.register_class(Foo)
+        sized_session.get_service("foo").by_ids([foo.get_id() for foo in foos])
+        assert len(sized_session.get_service("foo").cache) == 3
+
+        tiny_session = PybernateSession(self.connection, maxbytes=foos[0]._estimated_size() - 1)
+        tiny_session.register_class(Foo)
+        tiny_service = tiny_session.get_service("foo")
+        oversized = tiny_service.by_id(foos[0].get_id())
+        assert tiny_service.by_id(foos[0].get_id()) is oversized and len(tiny_service.cache) == 0
+        oversized.set_b("huge")
+        new_foo = Foo(a=7, b="new")
+        tiny_service.save(new_foo)
+        assert tiny_service.by_id(new_foo.get_id()) is new_foo
+        tiny_session.end_session()
+        assert tiny_service.by_id(foos[0].get_id()).get_b() == "huge"
+
+        ttl_session = PybernateSession(self.connection, policy="ttl", ttl=0.2)
+        ttl_session.register_class(Foo)
+        ttl_service = ttl_session.get_service("foo")
+        foo = ttl_service.by_id(foos[1].get_id())
+        foo.set_a(42)
+        time.sleep(0.3)
+        assert ttl_service.by_id(foo.get_id()) is foo
+        time.sleep(0.3)
+        ttl_service.by_ids([foo.get_id()])
+        ttl_session.end_session()
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT a FROM foo WHERE id = %s", [foo.get_id()])
+            assert cursor.fetchone()["a"] == 42
+
+    def test_query(self):
+        foos = [Foo(a=i, b=str(i % 3)) for i in range(30)]
+        self.foo_service.save(foos)
+        self.session.end_session()
+        session = PybernateSession(self.connection, stream_cursor=pymysql.cursors.SSDictCursor)
+        session.register_class(Foo)
+        foo_service = session.get_service("foo")
+        query = foo_service.query().filter("a", ">=", 10).filter_by(b="1").order_by("-a").limit(4)
+        assert [foo.get_a() for foo in query] == [28, 25, 22, 19]
+        assert len(foo_service.cache) == 0
+        assert [foo.get_a() for foo in foo_service.query().filter("a", "in", [3, 4, 99])] == [3, 4]
+        assert foo_service.query().filter("a", "in", (i for i in [])).all() == []
+        assert foo_service.query().filter("b", "=", None).first() is None
+        pages = list(foo_service.query().order_by("b").pages(7))
+        assert [len(page) for page in pages] == [7, 7, 7, 7, 2]
+        assert [foo.get_a() for page in pages for foo in page][:10] == [0, 3, 6, 9, 12, 15, 18, 21, 24, 27]
+        assert [foo.get_a() for foo in foo_service.query().order_by("b").after("2", foos[20].get_id())] == [23, 26, 29]
+        loaded_foo = foo_service.by_id(foos[0].get_id())
+        assert foo_service.query().filter_by(id=foos[0].get_id()).first() is loaded_foo
+        try:
+            foo_service.query().filter("c", "=", 1)
+            assert False
+        except ValueError:
+            pass
+
+        fez = Fez(a=1)
+        self.fez_service.save(fez)
+        self.bez_service.save(Bez(foreign_id=fez.get_id()))
+        self.session.end_session()
+        streamed = self.fez_service.query().filter_by(id=fez.get_id()).first()
+        with self.assertRaises(LazyInitializationException):
+            streamed.get_bez()
+        assert len(self.fez_service.by_id(fez.get_id()).get_bez()) == 1
+
+    def test_projection(self):
+        self.foo_service.save([Foo(a=i, b=str(i)) for i in range(5)])
+        self.session.end_session()
+        rows = list(self.foo_service.project("b", "a").filter("a", "<", 3).order_by("a"))
+        assert [(row.b, row.a) for row in rows] == [("0", 0), ("1", 1), ("2", 2)]
+        assert list(self.foo_service.project("a").order_by("-a").limit(2).tuples()) == [(4,), (3,)]
+        assert self.foo_service.project("a", "b").order_by("a").columns() == {"a": [0, 1, 2, 3, 4],
+                                                                                "b": ["0", "1", "2", "3", "4"]}
+        assert len(self.foo_service.cache) == 0
+        bar = Bar(c=1, d="lazy")
+        self.bar_service.save(bar)
+        assert list(self.bar_service.project("d").tuples()) == [("lazy",)]
+        self.bar_service.save([Bar(c=i, d=str(i)) for i in range(2, 5)])
+        self.session.end_session()
+        pages = list(self.bar_service.query().order_by("-d").pages(3))
+        assert [[bar.get_c() for bar in page] for page in pages] == [[1, 4, 3], [2]]
+
+    def test_dirty_columns(self):
+        foo = Foo(a=1, b="two")
+        self.foo_service.save(foo)
+        self.foo_service.flush_cache()
+        foo_too = self.foo_service.by_id(foo.get_id())
+        assert foo_too.get_update_fields() == []
+        foo_too.set_b("three")
+        foo_too.set_b("two")
+        assert foo_too.get_update_fields() == []
+        foo_too.set_a(2)
+        assert foo_too.get_update_fields() == ["a"]
+        self.foo_service.flush_cache()
+        assert self.foo_service.by_id(foo.get_id()).get_a() == 2
+
+    def test_statement_cache(self):
+        statements = Foo.get_mapper().statements
+        assert statements.update(["a"]) is statements.update(["a"])
+        assert statements.update(["a"]) == "UPDATE foo SET `a` = %s WHERE `id` = %s"
+        assert statements.select_lazy(4) == "SELECT `a`, `b`, `id` FROM foo WHERE `id` IN (%s, %s, %s, %s)"
+        assert Bar.get_mapper().statements.select_lazy() == "SELECT `c`, `not_id` FROM bar WHERE `not_id` = %s"
+
     def test_lazy_initialization(self):
         bar = Bar(c=2, d="three")
         self.bar_service.save(bar)
@@ -157,6 +628,56 @@ class Test(unittest.TestCase):
         self.bar_service.initialize(bar_too, "d")
         assert bar.get_d() == bar_too.get_d() == "three"
 
+        self.session.end_session()
+        detached = self.bar_service.by_id(bar.id)
+        self.session.end_session()
+        detached.set_c(5)
+        self.bar_service.save(detached)
+        self.session.end_session()
+        reloaded = self.bar_service.by_id(bar.id)
+        self.bar_service.initialize(reloaded)
+        assert reloaded.get_c() == 5 and reloaded.get_d() == "three"
+
+    def test_batch_initialization(self):
+        bars = [Bar(c=i, d=str(i)) for i in range(5)]
+        self.bar_service.save(bars)
+        self.session.end_session()
+        loaded_bars = self.bar_service.by_ids([bar.get_not_id() for bar in bars])
+        self.bar_service.initialize(loaded_bars[:3], "d")
+        assert [bar.get_d() for bar in loaded_bars[:3]] == ["0", "1", "2"]
+        assert not loaded_bars[3].is_loaded("d")
+        self.bar_service.initialize(loaded_bars)
+        assert [bar.get_d() for bar in loaded_bars] == ["0", "1", "2", "3", "4"]
+
+        session = PybernateSession(self.connection)
+        session.register_class(Bar, batch_lazy=True)
+        loaded_bars = session.get_service("bar").by_ids([bar.get_not_id() for bar in bars])
+        assert loaded_bars[2].get_d() == "2"
+        assert all(bar.is_loaded("d") for bar in loaded_bars)
+
+    def test_statistics(self):
+        fezzes = [Fez(a=i) for i in range(3)]
+        self.fez_service.save(fezzes)
+        self.bez_service.save([Bez(foreign_id=fez.get_id()) for fez in fezzes])
+        self.session.end_session()
+        session = PybernateSession(self.connection, slow_query_time=0, n_plus_one_threshold=3)
+        session.register_class(Fez, Bez, Pez)
+        queries = []
+        session.statistics.add_listener(lambda name, query, values, elapsed, rowcount: queries.append(query))
+        with self.assertLogs("Pybernate", level="WARNING"):
+            session.get_service("fez").by_ids([fez.get_id() for fez in fezzes])
+            session.get_service("fez").by_id(fezzes[0].get_id())
+        statistics = session.statistics.summary()
+        assert statistics["statements"]["SELECT"] == len(queries) == len(session.statistics.slow_queries)
+        assert statistics["cache_hits"] >= 1 and statistics["cache_misses"] >= 1
+        assert statistics["hydrated"] == 6
+        assert statistics["p50"] <= statistics["p99"]
+        assert statistics["n_plus_one"] == sorted(["SELECT `id` FROM bez WHERE `foreign_id` = %s",
+                                                   "SELECT `id` FROM pez WHERE `foreign_id` = %s",
+                                                   "SELECT `foreign_id`, `id` FROM bez WHERE `id` = %s"])
+        assert session.get_service("bez").statistics.hydrated == 3
+        assert session.get_service("fez").statistics.rows_fetched == 6
+
     def test_transient(self):
         bar = Bar(c=2, d="three")
         assert bar.get_other() == 5
@@ -179,6 +700,22 @@ class Test(unittest.TestCase):
         except NoSuchEntityException:
             pass
 
+    def test_end_session(self):
+        foos = [Foo(a=i, b=str(i)) for i in range(10)]
+        self.foo_service.save(foos)
+        for foo in foos[:5]:
+            foo.set_b("updated")
+        self.foo_service.delete(foos[5:8])
+        self.session.end_session()
+        loaded_foos = self.foo_service.by_ids([foo.get_id() for foo in foos[:5] + foos[8:]])
+        assert [foo.get_b() for foo in loaded_foos] == ["updated"] * 5 + ["8", "9"]
+        for foo in foos[5:8]:
+            try:
+                self.foo_service.by_id(foo.get_id())
+                assert False
+            except NoSuchEntityException:
+                pass
+
     def test_one_to_many(self):
         fez = Fez(a=1)
         self.fez_service.save(fez)
@@ -208,6 +745,100 @@ class Test(unittest.TestCase):
             mapped_pez = pezzes[color]
             assert mapped_pez.get_color() == color and mapped_pez.get_foreign_id() == fez.get_id()
 
+    def test_fetch_strategies(self):
+        kezzes = [Kez(a=i) for i in range(3)]
+        self.kez_service.save(kezzes)
+        for kez in kezzes:
+            self.lez_service.save([Lez(foreign_id=kez.get_id()), Lez(foreign_id=kez.get_id())])
+            self.mez_service.save([Mez(foreign_id=kez.get_id(), color=color) for color in ["blue", "green"]])
+        self.session.end_session()
+
+        loaded_kezzes = self.kez_service.by_ids([kez.get_id() for kez in kezzes])
+        for kez, loaded_kez in zip(kezzes, loaded_kezzes):
+            assert loaded_kez.get_a() == kez.get_a()
+            assert len(loaded_kez.get_lez()) == 2
+            for lez in loaded_kez.get_lez():
+                assert lez.get_foreign_id() == kez.get_id()
+                assert lez.get_kez() is loaded_kez
+            assert sorted(loaded_kez.get_mez().keys()) == ["blue", "green"]
+            assert loaded_kez.get_mez()["blue"].get_foreign_id() == kez.get_id()
+        self.session.end_session()
+
+        lezzes = self.lez_service.by_ids([lez.get_id() for kez in loaded_kezzes for lez in kez.get_lez()])
+        assert [lez.get_kez().get_a() for lez in lezzes] == [0, 0, 1, 1, 2, 2]
+
+    def test_session_factory(self):
+        pool = ConnectionPool(self.connect, size=1, timeout=0.1)
+        factory = SessionFactory(pool, Foo)
+        with factory.session() as session:
+            foo = Foo(a=1, b="two")
+            session.get_service("foo").save(foo)
+            foo.set_b("three")
+            try:
+                pool.checkout()
+                assert False
+            except PoolTimeoutException:
+                pass
+        with factory.session() as session:
+            assert session is factory.get_session()
+            assert session.get_service("foo").by_id(foo.get_id()).get_b() == "three"
+        assert pool.created == 1
+        pool.dispose()
+
+        pool = ConnectionPool(self.connect, size=1, timeout=5)
+        broken = pool.checkout()
+        waited = []
+        waiter = threading.Thread(target=lambda: waited.append(pool.checkout()))
+        waiter.start()
+        time.sleep(0.1)
+        broken.close()
+        pool.checkin(broken)
+        waiter.join()
+        assert waited[0] is not broken and pool.created == 1
+        pool.checkin(waited[0])
+        pool.dispose()
+
+    def test_second_level_cache(self):
+        second_level_cache = SecondLevelCache()
+        sessions = [PybernateSession(self.connection, second_level_cache=second_level_cache) for i in range(3)]
+        for session in sessions:
+            session.register_class(Jez, Foo)
+        jez = Jez(a=1)
+        sessions[0].get_service("jez").save(jez)
+        sessions[0].end_session()
+        assert sessions[1].get_service("jez").by_id(jez.get_id()).get_a() == 1
+        assert second_level_cache.get_region(Jez).get(jez.get_id()) == {"a": 1, "id": jez.get_id()}
+        assert second_level_cache.get_region(Foo) is None
+        with self.connection.cursor() as cursor:
+            cursor.execute("UPDATE jez SET a = 2")
+        self.connection.commit()
+        loaded_jez = sessions[2].get_service("jez").by_id(jez.get_id())
+        assert loaded_jez.get_a() == 1
+        loaded_jez.set_a(3)
+        sessions[2].end_session()
+        assert second_level_cache.get_region(Jez).get(jez.get_id()) is None
+        sessions[1].end_session()
+        assert sessions[1].get_service("jez").by_id(jez.get_id()).get_a() == 3
+
+        def invalidate(name, query, values, elapsed, rowcount):
+            if not invalidated:
+                invalidated.append(query)
+                with self.connection.cursor() as cursor:
+                    cursor.execute("UPDATE jez SET a = 4")
+                self.connection.commit()
+                second_level_cache.evict(Jez, jez.get_id())
+
+        invalidated = []
+        second_level_cache.evict(Jez, jez.get_id())
+        reader = PybernateSession(self.connection, second_level_cache=second_level_cache)
+        reader.register_class(Jez)
+        reader.statistics.add_listener(invalidate)
+        assert reader.get_service("jez").by_id(jez.get_id()).get_a() == 3
+        assert second_level_cache.get_region(Jez).get(jez.get_id()) is None
+        reader.end_session()
+        assert reader.get_service("jez").by_id(jez.get_id()).get_a() == 4
+        assert second_level_cache.get_region(Jez).get(jez.get_id()) == {"a": 4, "id": jez.get_id()}
+
     def test_wrong_entity_for_service(self):
         fez = Fez(a=2)
         try:
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+
+class MemoryCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.db.cursor()
+        self.lastrowid = None
+        self.rowcount = -1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.cursor.close()
+
+    async def _pause(self):
+        await asyncio.sleep(self.connection.pool.latency)
+
+    async def execute(self, query, values=()):
+        await self._pause()
+        self.connection.pool.queries.append(query)
+        self.cursor.execute(query.replace("%s", "?"), list(values))
+        self.lastrowid = self.cursor.lastrowid
+        self.rowcount = self.cursor.rowcount
+
+    async def executemany(self, query, values):
+        await self._pause()
+        self.connection.pool.queries.append(query)
+        self.cursor.executemany(query.replace("%s", "?"), [list(value) for value in values])
+        self.rowcount = self.cursor.rowcount
+
+    def _row(self, row):
+        return {description[0]: value for description, value in zip(self.cursor.description, row)}
+
+    async def fetchone(self):
+        row = self.cursor.fetchone()
+        return None if row is None else self._row(row)
+
+    async def fetchall(self):
+        return [self._row(row) for row in self.cursor.fetchall()]
+
+
+class MemoryConnection:
+    def __init__(self, pool, db):
+        self.pool = pool
+        self.db = db
+
+    def cursor(self):
+        return MemoryCursor(self)
+
+    async def commit(self):
+        self.db.commit()
+
+    async def rollback(self):
+        self.db.rollback()
+
+    def close(self):
+        self.db.close()
+
+
+class _Acquire:
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+
+    def __await__(self):
+        return self.pool._acquire().__await__()
+
+    async def __aenter__(self):
+        self.conn = await self.pool._acquire()
+        return self.conn
+
+    async def __aexit__(self, *args):
+        self.pool.release(self.conn)
+
+
+class MemoryPool:
+    def __init__(self, latency=0):
+        handle, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.db = sqlite3.connect(self.path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.latency = latency
+        self.active = 0
+        self.max_active = 0
+        self.queries = []
+        self.free = []
+
+    def acquire(self):
+        return _Acquire(self)
+
+    async def _acquire(self):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        if self.free:
+            return self.free.pop()
+        return MemoryConnection(self, sqlite3.connect(self.path))
+
+    def release(self, conn):
+        self.active -= 1
+        conn.db.rollback()
+        self.free.append(conn)
+
+    def execute(self, query):
+        self.db.execute(query)
+
+    def close(self):
+        for conn in self.free:
+            conn.close()
+        self.free = []
+        self.db.close()
+        for path in (self.path, self.path + "-wal", self.path + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
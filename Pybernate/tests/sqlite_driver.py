@@ -0,0 +1,84 @@
+import sqlite3
+import time
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.db.cursor()
+        self.rows = []
+        self.description = None
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.cursor.close()
+
+    def _execute(self, query):
+        self.connection.queries += 1
+        if self.connection.latency:
+            time.sleep(self.connection.latency)
+        return query.replace("%s", "?").replace("INT AUTO_INCREMENT KEY", "INTEGER PRIMARY KEY AUTOINCREMENT")
+
+    def execute(self, query, values=()):
+        self.cursor.execute(self._execute(query), list(values))
+        self.rows = []
+        self.description = self.cursor.description
+        self.rowcount = self.cursor.rowcount
+        if self.description is not None:
+            self.rows = self.cursor.fetchall()
+            if self.connection.dict_rows:
+                names = [description[0] for description in self.description]
+                self.rows = [dict(zip(names, row)) for row in self.rows]
+            self.rowcount = len(self.rows)
+        self.lastrowid = self.cursor.lastrowid
+        if query.startswith("INSERT") and self.rowcount > 1 and self.connection.mysql_lastrowid:
+            self.lastrowid -= self.rowcount - 1
+        return self.rowcount
+
+    def executemany(self, query, values):
+        self.cursor.executemany(self._execute(query), [list(value) for value in values])
+        self.rowcount = self.cursor.rowcount
+        return self.rowcount
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+
+class Connection:
+    def __init__(self, database=":memory:", latency=0, dict_rows=True, mysql_lastrowid=True):
+        self.db = sqlite3.connect(database, check_same_thread=False)
+        self.latency = latency
+        self.dict_rows = dict_rows
+        self.mysql_lastrowid = mysql_lastrowid
+        self.queries = 0
+
+    def cursor(self, *args):
+        return Cursor(self)
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def close(self):
+        self.db.close()
+
+
+def connect(database=":memory:", latency=0, dict_rows=True, mysql_lastrowid=True):
+    return Connection(database, latency, dict_rows, mysql_lastrowid)
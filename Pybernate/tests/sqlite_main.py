@@ -0,0 +1,268 @@
+import functools
+import os
+import tempfile
+import unittest
+from Pybernate.Entity import IdEntity
+from Pybernate.Bulk import BulkExporter, BulkImporter
+from Pybernate.Annotations import lazy, oneToMany, manyToOne
+from Pybernate.Dialect import SQLiteDialect, PostgreSQLDialect
+from Pybernate.EntityService import SafeExecutor
+from Pybernate.Exceptions import NoSuchEntityException, SchemaMismatchException, BulkTaskException
+from Pybernate.Session import PybernateSession
+from Pybernate.tests.sqlite_driver import connect
+
+
+class Tez(IdEntity):
+    def get_a(self):
+        return
+
+    def set_a(self, val):
+        return
+
+    @lazy
+    def get_b(self):
+        return
+
+    def set_b(self, val):
+        return
+
+    @oneToMany(join_column="id", join_table="uez", foreign_key="foreign_id", fetch="join")
+    def get_uez(self):
+        return
+
+
+class Uez(IdEntity):
+    @manyToOne(join_column="foreign_id", join_table="tez", foreign_key="id", fetch="batch")
+    def get_tez(self):
+        return
+
+    def get_foreign_id(self):
+        return
+
+
+class Vez(IdEntity):
+    def get_a(self):
+        return
+
+    def get_b(self):
+        return
+
+
+class Kez(IdEntity):
+    def get_new(self):
+        return
+
+    def set_new(self, val):
+        return
+
+    def get_size(self):
+        return
+
+
+class Xez(IdEntity):
+    def get_a(self):
+        return
+
+    def get_b(self):
+        return
+
+    def get_c(self):
+        return
+
+    def get_d(self):
+        return
+
+
+class PreparedCursor:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class PreparedConnection:
+    def cursor(self, prepared=False, dictionary=False):
+        return PreparedCursor()
+
+
+class SQLiteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = connect(dict_rows=False, mysql_lastrowid=False)
+        with self.connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE tez ("a" INT, "b" VARCHAR(10), "id" INTEGER PRIMARY KEY AUTOINCREMENT)')
+            cursor.execute('CREATE TABLE uez ("foreign_id" INT, "id" INTEGER PRIMARY KEY AUTOINCREMENT)')
+            cursor.execute('CREATE TABLE kez ("new" INT, "size" INT, "id" INTEGER PRIMARY KEY AUTOINCREMENT)')
+        self.connection.commit()
+        self.session = PybernateSession(self.connection, dialect=SQLiteDialect())
+        self.session.register_class(Tez, Uez)
+        self.tez_service = self.session.get_service("tez")
+        self.uez_service = self.session.get_service("uez")
+
+    def tearDown(self):
+        self.connection.close()
+
+    def test_statements(self):
+        statements = Tez.get_mapper().get_statements(SQLiteDialect())
+        assert statements is Tez.get_mapper().get_statements(SQLiteDialect())
+        assert statements.select_lazy(2) == 'SELECT "a", "id" FROM tez WHERE "id" IN (?, ?)'
+        assert Tez.get_mapper().statements.select_lazy() == "SELECT `a`, `id` FROM tez WHERE `id` = %s"
+        postgresql = Tez.get_mapper().get_statements(PostgreSQLDialect())
+        assert postgresql.insert(["a"], 2) == 'INSERT INTO tez ("a") VALUES (%s), (%s) RETURNING "id"'
+        assert postgresql.insert([]) == 'INSERT INTO tez DEFAULT VALUES RETURNING "id"'
+        assert statements.insert([]) == "INSERT INTO tez DEFAULT VALUES"
+        assert Tez.get_mapper().statements.insert([], 2) == "INSERT INTO tez () VALUES (), ()"
+        empty = [Tez(), Tez(), Tez()]
+        self.tez_service.save(empty)
+        assert [tez.get_id() for tez in empty] == [1, 2, 3]
+
+    def test_explicit_nulls(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE vez ("a" INT, "b" VARCHAR(10) DEFAULT \'default\', '
+                           '"id" INTEGER PRIMARY KEY AUTOINCREMENT)')
+        self.session.register_class(Vez)
+        queries = []
+        self.session.statistics.add_listener(lambda name, query, values, elapsed, rowcount: queries.append(query))
+        vezzes = [Vez(a=1, b=None), Vez(a=2, b="two"), Vez(a=3)]
+        self.session.get_service("vez").save(vezzes)
+        assert len(queries) == 2
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT "b" FROM vez ORDER BY "id"')
+            assert cursor.fetchall() == [(None,), ("two",), ("default",)]
+
+    def test_reserved_column_names(self):
+        self.session.register_class(Kez)
+        kez = Kez(new=1)
+        self.session.get_service("kez").save(kez)
+        assert kez.get_id() == 1 and kez.get_new() == 1
+        self.session.end_session()
+        assert self.session.get_service("kez").by_id(1).get_new() == 1
+        session = PybernateSession(self.connection, dialect=SQLiteDialect(), maxbytes=10 ** 6)
+        session.register_class(Kez)
+        sized = Kez(new=2, size=3)
+        session.get_service("kez").save(sized)
+        assert sized.get_size() == 3 and session.get_service("kez").by_id(sized.get_id()) is sized
+
+    def test_prepared_cursors(self):
+        executor = SafeExecutor("tez", PreparedConnection(), prepared=True, max_prepared=2)
+        first, second = executor.get_cursor(None, "first"), executor.get_cursor(None, "second")
+        assert executor.get_cursor(None, "first") is first
+        executor.get_cursor(None, "third")
+        assert second.closed and not first.closed and len(executor.prepared_cursors) == 2
+        executor.close()
+        assert first.closed and len(executor.prepared_cursors) == 0
+
+    def test_schema(self):
+        session = PybernateSession(self.connection, dialect=SQLiteDialect(), validate_schema=True)
+        session.register_class(Tez)
+        schema = session.get_service("tez").schema
+        assert schema.columns == ["a", "b", "id"]
+        assert schema.types == {"a": "INT", "b": "VARCHAR(10)", "id": "INTEGER"}
+        with self.connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE vez ("a" INT, "id" VARCHAR(10))')
+        with self.assertRaises(SchemaMismatchException) as context:
+            session.register_class(Vez)
+        assert context.exception.problems == ["column b does not exist", "column id is VARCHAR(10), not an integer"]
+
+    def test_save_load(self):
+        tezzes = [Tez(a=i, b=str(i)) for i in range(1200)]
+        self.tez_service.save(tezzes)
+        assert [tez.get_id() for tez in tezzes] == list(range(1, 1201))
+        self.session.end_session()
+        self.tez_service.by_id(tezzes[0].get_id()).set_a(-1)
+        self.tez_service.delete(self.tez_service.by_id(tezzes[1].get_id()))
+        self.session.end_session()
+        loaded = self.tez_service.by_ids([tez.get_id() for tez in tezzes[2:]])
+        assert [tez.get_a() for tez in loaded] == list(range(2, 1200))
+        self.tez_service.initialize(loaded)
+        assert [tez.get_b() for tez in loaded[:3]] == ["2", "3", "4"]
+        assert self.tez_service.by_id(tezzes[0].get_id()).get_a() == -1
+        with self.assertRaises(NoSuchEntityException):
+            self.tez_service.by_id(tezzes[1].get_id())
+
+    def test_relationships_and_queries(self):
+        tezzes = [Tez(a=i) for i in range(3)]
+        self.tez_service.save(tezzes)
+        self.uez_service.save([Uez(foreign_id=tez.get_id()) for tez in tezzes for i in range(2)])
+        self.session.end_session()
+        for tez in self.tez_service.by_ids([tez.get_id() for tez in tezzes]):
+            assert len(tez.get_uez()) == 2
+            assert tez.get_uez()[0].get_tez() is tez
+        assert [tez.get_a() for tez in self.tez_service.query().filter("a", ">", 0).order_by("-a")] == [2, 1]
+        assert list(self.tez_service.project("a").order_by("a").tuples()) == [(0,), (1,), (2,)]
+
+    def test_bulk_export_import(self):
+        directory = tempfile.mkdtemp()
+        source = os.path.join(directory, "source.db")
+        target = os.path.join(directory, "target.db")
+        for database in (source, target):
+            connection = connect(database)
+            with connection.cursor() as cursor:
+                cursor.execute('CREATE TABLE tez ("a" INT, "b" VARCHAR(10), "id" INTEGER PRIMARY KEY AUTOINCREMENT)')
+            connection.commit()
+            connection.close()
+        session = PybernateSession(connect(source, dict_rows=False, mysql_lastrowid=False), dialect=SQLiteDialect())
+        session.register_class(Tez)
+        session.get_service("tez").save([Tez(a=i, b=str(i) if i % 7 else None) for i in range(250)])
+        session.end_session()
+        session.conn.close()
+        source_connect = functools.partial(connect, source, dict_rows=False, mysql_lastrowid=False)
+        target_connect = functools.partial(connect, target, dict_rows=False, mysql_lastrowid=False)
+        progress = []
+        exporter = BulkExporter(source_connect, Tez, SQLiteDialect(), workers=2, batch_size=30,
+                                progress=lambda done, total, rows: progress.append((done, total, rows)))
+        paths = exporter.export(os.path.join(directory, "csv"), partition_size=100)
+        assert [os.path.basename(path) for path in paths] == ["tez-00000.csv", "tez-00001.csv", "tez-00002.csv"]
+        assert progress[-1] == (3, 3, 250)
+        assert exporter.export(os.path.join(directory, "csv"), partition_size=100, resume=True) == paths
+        assert progress[-1] == (3, 3, 250)
+        jsonl = exporter.export(os.path.join(directory, "jsonl"), "jsonl", partition_size=1000)
+        importer = BulkImporter(target_connect, Tez, SQLiteDialect(), workers=1, batch_size=40)
+        assert importer.import_files(paths[:2]) == 200
+        assert importer.import_files(paths[2:]) == 50
+        with self.assertRaises(BulkTaskException):
+            importer.import_files(jsonl)
+        tables = []
+        for database_connect in (source_connect, target_connect):
+            connection = database_connect()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT "a", "b", "id" FROM tez ORDER BY "id"')
+                tables.append(cursor.fetchall())
+            connection.close()
+        assert len(tables[1]) == 250
+        assert tables[0] == tables[1]
+
+    def test_bulk_types(self):
+        directory = tempfile.mkdtemp()
+        paths = {}
+        for name in ("source", "csv", "jsonl"):
+            paths[name] = os.path.join(directory, name + ".db")
+            connection = connect(paths[name])
+            with connection.cursor() as cursor:
+                cursor.execute('CREATE TABLE xez ("a" INT, "b" VARCHAR(10), "c" REAL, "d" BLOB, '
+                               '"id" INTEGER PRIMARY KEY AUTOINCREMENT)')
+            connection.commit()
+            connection.close()
+        rows = [(1, "\\N", 1.5, b"\x00\xff", 1), (None, None, None, None, 2), (-3, "\\x", 0.0, b"", 3),
+                (4, "", 2.25, b"\\N", 4)]
+        connection = connect(paths["source"], dict_rows=False)
+        with connection.cursor() as cursor:
+            cursor.executemany('INSERT INTO xez ("a", "b", "c", "d", "id") VALUES (%s, %s, %s, %s, %s)', rows)
+        connection.commit()
+        connection.close()
+        for file_format in ("csv", "jsonl"):
+            source_connect = functools.partial(connect, paths["source"], dict_rows=False, mysql_lastrowid=False)
+            exported = BulkExporter(source_connect, Xez, SQLiteDialect(), workers=1).export(
+                os.path.join(directory, file_format), file_format)
+            target_connect = functools.partial(connect, paths[file_format], dict_rows=False, mysql_lastrowid=False)
+            assert BulkImporter(target_connect, Xez, SQLiteDialect(), workers=1).import_files(exported) == 4
+            connection = target_connect()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT "a", "b", "c", "d", "id" FROM xez ORDER BY "id"')
+                assert cursor.fetchall() == rows
+            connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()